@@ -0,0 +1,109 @@
+"""Write-behind audit log: events are queued in-process and bulk-inserted by a background thread."""
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+
+from processLocal import ProcessLocal
+
+INSERT_LOGS_SQL = "INSERT INTO user_logs (user_id, action, details, created_at) VALUES (%s, %s, %s, %s)"
+
+_STOP = object()
+
+
+class ActivityLogWriter:
+    """Buffers user_logs rows and writes them with one executemany per batch.
+
+    A batch is flushed when it reaches `batch_size` rows or `flush_interval` seconds after its
+    first row. When `max_queue` events are waiting, log() blocks for at most `put_timeout`
+    seconds and then drops the event, so a slow database never stalls requests for long.
+    """
+
+    def __init__(self, get_connection, batch_size=200, flush_interval=1.0, max_queue=10000, put_timeout=0.01):
+        self._get_connection = get_connection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        # Started on first use in each process, forked workers included (threads don't survive fork)
+        self._thread = ProcessLocal(self._start_writer)
+        self._stats = dict(queued=0, written=0, dropped=0, failed=0, batches=0)
+        atexit.register(self.shutdown)
+
+    def _start_writer(self):
+        thread = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+        thread.start()
+        return thread
+
+    def log(self, user_id, action, details=None):
+        self._thread.get()
+        try:
+            self._queue.put((user_id, action, details, datetime.now()), timeout=self.put_timeout)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('queued')
+        return True
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+            if stop:
+                return
+
+    def _flush(self, batch):
+        conn = self._get_connection()
+        if not conn:
+            self._count('failed', len(batch))
+            return
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(INSERT_LOGS_SQL, batch)
+            conn.commit()
+            self._count('written', len(batch))
+            self._count('batches')
+        except Exception as err:
+            print(f"Error logging activity: {err}")
+            self._count('failed', len(batch))
+        finally:
+            cursor.close()
+            conn.close()
+
+    def shutdown(self, timeout=5.0):
+        # Flush whatever is queued and stop the writer thread
+        thread = self._thread.current()
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['pending'] = self._queue.qsize()
+        return stats
@@ -0,0 +1,19 @@
+"""Shared-token guard for operational /admin endpoints."""
+import hmac
+import os
+from functools import wraps
+
+from flask import jsonify, request
+
+# Admin endpoints stay closed unless a token is configured
+ADMIN_TOKEN = os.environ.get('ADHD_ADMIN_TOKEN', '')
+
+
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = request.headers.get('X-Admin-Token', '')
+        if not ADMIN_TOKEN or not hmac.compare_digest(token, ADMIN_TOKEN):
+            return jsonify({'error': 'Forbidden'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
@@ -1,16 +1,49 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-from werkzeug.security import check_password_hash, generate_password_hash
-from datetime import datetime
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response, g
 import pymysql
+import os
 import re
+import json
+import math
 from functools import wraps
-import joblib
-import numpy as np
-import pandas as pd
+from modelBundle import BundleLoader, BundleError
+from dbPool import ConnectionPool, PoolTimeout
+from activityLog import ActivityLogWriter
+from resultsCache import RecentResultsCache
+from predictionCache import PredictionCache
+from driftMonitor import DriftMonitor
+from cptScores import EXPORT_MISMATCHED, N_TRIALS as CPT_TRIALS
+from cptLive import LiveCPTScorer, TrialError
+from resultStats import CREATE_STATS_TABLES, record_result, read_summary
+from resultsExport import FORMATS as EXPORT_FORMATS, export_results
+from passwordHasher import PasswordHasher, HasherBusy
+from sessionStore import MemorySessionStore, SQLiteSessionStore, ServerSideSessionInterface, UserCache
+from adminAuth import admin_required
+import modelAdmin
+from metrics import Metrics, current_route
+from samplingProfiler import SamplingProfiler
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this-in-production'
 
+# Request/stage timers and counters, served on /metrics. Under serve.py with several workers each
+# worker also writes them (and its drift, cache and profiler state) to ADHD_METRICS_DIR, so any
+# worker can answer for all of them
+metrics = Metrics(shard_dir=os.environ.get('ADHD_METRICS_DIR'))
+metrics.instrument(app)
+
+# Off unless enabled here (ADHD_PROFILE=1) or via POST /admin/profiler; profiles 1 in `every`
+# requests to `routes` (all routes when empty) and serves the stacks on /admin/profiler/flamegraph
+PROFILER_CONFIG = {
+    'enabled': os.environ.get('ADHD_PROFILE') == '1',
+    'routes': [r for r in os.environ.get('ADHD_PROFILE_ROUTES', '').split(',') if r],
+    'every': int(os.environ.get('ADHD_PROFILE_EVERY', 100)),
+    'interval': 0.005,
+    'max_stacks': 5000
+}
+
+profiler = SamplingProfiler(workers=metrics.workers, **PROFILER_CONFIG)
+profiler.instrument(app)
+
 DB_CONFIG = {
     'host': 'localhost',
     'user': 'root',
@@ -19,19 +52,78 @@ DB_CONFIG = {
     'charset': 'utf8mb4'
 }
 
-# Load model, scaler, and features
-try:
-    model = joblib.load('lr_model.pkl')
-    scaler = joblib.load('scaler.pkl')
-    features = joblib.load('features.pkl')
-except FileNotFoundError as e:
-    print(f"Error loading model files: {e}")
-    model, scaler, features = None, None, []
+# Connections are reused across requests; size the pool with /admin/db-pool
+DB_POOL_CONFIG = {
+    'max_size': 10,
+    'checkout_timeout': 5.0,
+    'max_lifetime': 1800,
+    'health_check_after': 30
+}
+
+ACTIVITY_LOG_CONFIG = {
+    'batch_size': 200,
+    'flush_interval': 1.0,
+    'max_queue': 10000,
+    'put_timeout': 0.01
+}
+
+# Session payloads and cached user records stay on the server; the cookie holds only an opaque ID.
+# Local SQLite file shared by worker processes; serve.py sets it (--session-db) when running several workers
+SESSION_CONFIG = {
+    'sqlite_path': os.environ.get('ADHD_SESSION_DB'),
+    'max_sessions': 100000,
+    'user_ttl': 300.0
+}
+
+# Password KDFs run on their own small pool so a login burst can't take every CPU;
+# max_pending bounds how many requests may wait for it (more are turned away)
+KDF_CONFIG = {
+    'max_workers': max(1, (os.cpu_count() or 2) // 2),
+    'max_pending': 64,
+    'timeout': 10.0
+}
+
+# Recent results shown on the dashboard, per user; invalidations reach every worker through the session store
+RESULTS_CACHE_CONFIG = {
+    'max_users': 10000,
+    'ttl': 60.0
+}
+
+# Scores of recently seen feature vectors, per model version
+PREDICTION_CACHE_CONFIG = {
+    'max_entries': 20000,
+    'ttl': 3600.0
+}
+
+# Model, scaler and features come from one bundle, loaded on first use and
+# hot-reloaded when the artifact files change
+MODEL_WATCH_INTERVAL = 5.0
+
+model_loader = BundleLoader(watch_interval=MODEL_WATCH_INTERVAL)
+
+def get_model_bundle():
+    try:
+        return model_loader.get()
+    except (OSError, BundleError) as e:
+        print(f"Error loading model files: {e}")
+        return None
+
+def connect_db():
+    return pymysql.connect(**DB_CONFIG, cursorclass=pymysql.cursors.DictCursor)
+
+def count_db_round_trip():
+    metrics.inc('db_round_trips_total', (('route', current_route()),))
+
+db_pool = ConnectionPool(connect_db, on_round_trip=count_db_round_trip, **DB_POOL_CONFIG)
+
+# MySQL error code for a UNIQUE key violation
+ER_DUP_ENTRY = 1062
 
 def get_db_connection():
+    # Pooled connection; close() returns it to the pool
     try:
-        return pymysql.connect(**DB_CONFIG, cursorclass=pymysql.cursors.DictCursor)
-    except pymysql.MySQLError as err:
+        return db_pool.connection()
+    except (pymysql.MySQLError, PoolTimeout) as err:
         print(f"Database connection error: {err}")
         return None
 
@@ -63,7 +155,9 @@ def init_db():
                 message TEXT,
                 risk_level ENUM('Low', 'Medium', 'High') DEFAULT 'Low',
                 responses JSON,
+                model_version VARCHAR(64),
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_results_user_created (user_id, created_at),
                 FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
             )
         """
@@ -81,6 +175,9 @@ def init_db():
             cursor.execute(create_users_table)
             cursor.execute(create_results_table)
             cursor.execute(create_logs_table)
+            for statement in CREATE_STATS_TABLES:
+                cursor.execute(statement)
+            migrate_schema(cursor)
             conn.commit()
             print("✅ Database tables created successfully!")
         except pymysql.MySQLError as err:
@@ -89,6 +186,41 @@ def init_db():
             cursor.close()
             conn.close()
 
+def index_exists(cursor, table, index):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    """, (table, index))
+    return cursor.fetchone() is not None
+
+def column_exists(cursor, table, column):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        LIMIT 1
+    """, (table, column))
+    return cursor.fetchone() is not None
+
+def migrate_schema(cursor):
+    # Bring databases created by older versions of init_db up to the current schema
+    if not index_exists(cursor, 'results', 'idx_results_user_created'):
+        print("🔧 Adding index idx_results_user_created on results(user_id, created_at)...")
+        cursor.execute("ALTER TABLE results ADD INDEX idx_results_user_created (user_id, created_at)")
+    if not column_exists(cursor, 'results', 'model_version'):
+        print("🔧 Adding column results.model_version...")
+        cursor.execute("ALTER TABLE results ADD COLUMN model_version VARCHAR(64) AFTER responses")
+    # record_result counts each user's results in result_users; seed it for results saved before it existed
+    cursor.execute("SELECT 1 FROM result_users LIMIT 1")
+    if cursor.fetchone() is None:
+        cursor.execute("SELECT 1 FROM results LIMIT 1")
+        if cursor.fetchone() is not None:
+            print("🔧 Filling result_users from results...")
+            cursor.execute("""
+                INSERT INTO result_users (user_id, results)
+                SELECT user_id, COUNT(*) FROM results WHERE user_id IS NOT NULL GROUP BY user_id
+            """)
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -102,21 +234,55 @@ def validate_email(email):
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(pattern, email) is not None
 
-def log_user_activity(user_id, action, details=None):
+if SESSION_CONFIG['sqlite_path']:
+    session_store = SQLiteSessionStore(SESSION_CONFIG['sqlite_path'])
+else:
+    session_store = MemorySessionStore(max_sessions=SESSION_CONFIG['max_sessions'])
+app.session_interface = ServerSideSessionInterface(session_store)
+user_cache = UserCache(session_store, ttl=SESSION_CONFIG['user_ttl'])
+
+def load_user(user_id):
     conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
-                "INSERT INTO user_logs (user_id, action, details, created_at) VALUES (%s, %s, %s, %s)",
-                (user_id, action, details, datetime.now())
-            )
-            conn.commit()
-        except pymysql.MySQLError as err:
-            print(f"Error logging activity: {err}")
-        finally:
-            cursor.close()
-            conn.close()
+    if not conn:
+        return None
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
+        return cursor.fetchone()
+    except pymysql.MySQLError as err:
+        print(f"Error loading user {user_id}: {err}")
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+
+def current_user():
+    # Logged-in user's record from the user cache (the users table only on a miss), once per request
+    if 'user_id' not in session:
+        return None
+    if '_current_user' not in g:
+        g._current_user = user_cache.get(session['user_id'], load_user)
+    return g._current_user
+
+recent_results_cache = RecentResultsCache(session_store, **RESULTS_CACHE_CONFIG)
+password_hasher = PasswordHasher(**KDF_CONFIG)
+prediction_cache = PredictionCache(workers=metrics.workers, **PREDICTION_CACHE_CONFIG)
+# Live feature histograms compared with the bundle's training profile on /admin/drift
+drift_monitor = DriftMonitor(workers=metrics.workers)
+modelAdmin.instrument(app, model_loader, prediction_cache, drift_monitor)
+
+# Audit rows are written in batches by a background thread, off the request path
+activity_log = ActivityLogWriter(get_db_connection, **ACTIVITY_LOG_CONFIG)
+
+def log_user_activity(user_id, action, details=None):
+    activity_log.log(user_id, action, details)
+
+def risk_level_for(percentage):
+    if percentage > 66.67:
+        return 'High'
+    if percentage > 33.33:
+        return 'Medium'
+    return 'Low'
 
 @app.route('/')
 def index():
@@ -142,22 +308,29 @@ def login_post():
         try:
             cursor.execute("SELECT * FROM users WHERE email = %s AND is_active = TRUE", (email,))
             user = cursor.fetchone()
-            if user and check_password_hash(user['password'], password):
-                session['user_id'] = user['id']
-                session['user_name'] = user['name']
-                session['user_email'] = user['email']
-                session['logged_in'] = True
-                log_user_activity(user['id'], 'login')
-                flash(f'Welcome back, {user["name"]}!', 'success')
-                return redirect(url_for('dashboard'))
-            else:
-                flash('Invalid email or password.', 'error')
         except pymysql.MySQLError as err:
             flash('Database error.', 'error')
             print(f"Error: {err}")
+            return redirect(url_for('login'))
         finally:
+            # Hand the connection back before the (slow) password check
             cursor.close()
             conn.close()
+        try:
+            valid = bool(user) and password_hasher.check(user['password'], password)
+        except HasherBusy:
+            metrics.error('kdf_busy')
+            flash('Too many sign-ins right now, please try again in a moment.', 'error')
+            return redirect(url_for('login'))
+        if valid:
+            session.regenerate()
+            session['user_id'] = user['id']
+            session['logged_in'] = True
+            user_cache.set(user)
+            log_user_activity(user['id'], 'login')
+            flash(f'Welcome back, {user["name"]}!', 'success')
+            return redirect(url_for('dashboard'))
+        flash('Invalid email or password.', 'error')
     return redirect(url_for('login'))
 
 @app.route('/register', methods=['POST'])
@@ -185,15 +358,17 @@ def register():
     if len(password) < 6:
         flash('Password must be at least 6 characters.', 'error')
         return redirect(url_for('login'))
+    try:
+        hashed_pw = password_hasher.hash(password)
+    except HasherBusy:
+        metrics.error('kdf_busy')
+        flash('Too many sign-ups right now, please try again in a moment.', 'error')
+        return redirect(url_for('login'))
     conn = get_db_connection()
     if conn:
         cursor = conn.cursor()
         try:
-            cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
-            if cursor.fetchone():
-                flash('Email already exists.', 'error')
-                return redirect(url_for('login'))
-            hashed_pw = generate_password_hash(password)
+            # email is UNIQUE, so the INSERT itself is the duplicate check
             cursor.execute("""
                 INSERT INTO users (name, email, password, age, gender, phone, address)
                 VALUES (%s, %s, %s, %s, %s, %s, %s)
@@ -202,6 +377,9 @@ def register():
             flash('Registration successful! Please log in.', 'success')
             return redirect(url_for('login'))
         except pymysql.MySQLError as err:
+            if isinstance(err, pymysql.err.IntegrityError) and err.args[0] == ER_DUP_ENTRY:
+                flash('Email already exists.', 'error')
+                return redirect(url_for('login'))
             flash('Registration error.', 'error')
             print(f"Error: {err}")
         finally:
@@ -212,63 +390,74 @@ def register():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    user_name = session.get('user_name')
-    recent_results = []
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                SELECT id, percentage, risk_level, message, created_at
-                FROM results
-                WHERE user_id = %s
-                ORDER BY created_at DESC
-                LIMIT 5
-            """, (session['user_id'],))
-            recent_results = cursor.fetchall()
-        finally:
-            cursor.close()
-            conn.close()
+    user = current_user()
+    user_name = user['name'] if user else ''
+    recent_results = recent_results_cache.get(session['user_id'])
+    if recent_results is None:
+        recent_results = []
+        generation = recent_results_cache.generation(session['user_id'])
+        conn = get_db_connection()
+        if conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT id, percentage, risk_level, message, created_at
+                    FROM results
+                    WHERE user_id = %s
+                    ORDER BY created_at DESC
+                    LIMIT 5
+                """, (session['user_id'],))
+                recent_results = cursor.fetchall()
+                recent_results_cache.set(session['user_id'], recent_results, generation)
+            finally:
+                cursor.close()
+                conn.close()
     return render_template('dashboard.html', user_name=user_name, recent_results=recent_results)
 
 @app.route('/checklist', methods=['GET', 'POST'])
 @login_required
 def checklist():
+    bundle = get_model_bundle()
+    features = bundle.features if bundle else []
     if request.method == 'POST':
-        if not model or not scaler or not features:
+        if not bundle or not features:
             flash('Model files not loaded properly.', 'error')
             return redirect(url_for('checklist'))
         
         try:
             # Handle form data or JSON
-            if request.is_json:
-                data = request.get_json()
-            else:
-                data = request.form.to_dict()
+            with metrics.stage('parse'):
+                if request.is_json:
+                    data = request.get_json()
+                else:
+                    data = request.form.to_dict()
             
-            input_data = []
-            for feature in features:
-                if feature not in data:
-                    flash(f'Missing feature: {feature}', 'error')
-                    return redirect(url_for('checklist'))
-                try:
-                    input_data.append(float(data[feature]))
-                except (ValueError, TypeError):
-                    flash(f'Invalid value for {feature}: {data[feature]}', 'error')
-                    return redirect(url_for('checklist'))
-
-            # Scale input
-            input_scaled = scaler.transform([input_data])
+            with metrics.stage('convert'):
+                input_data = []
+                for feature in features:
+                    if feature not in data:
+                        metrics.error('missing_feature')
+                        flash(f'Missing feature: {feature}', 'error')
+                        return redirect(url_for('checklist'))
+                    try:
+                        value = float(data[feature])
+                    except (ValueError, TypeError):
+                        value = math.nan
+                    # float() also accepts "nan" and "inf", which no model can score
+                    if not math.isfinite(value):
+                        metrics.error('invalid_feature')
+                        flash(f'Invalid value for {feature}: {data[feature]}', 'error')
+                        return redirect(url_for('checklist'))
+                    input_data.append(value)
 
-            # Predict
-            prediction = model.predict(input_scaled)[0]
+            # Scale and predict in one fused pass, unless this exact vector was scored recently
+            with metrics.stage('score'):
+                prediction = prediction_cache.probability(
+                    bundle.version, input_data, lambda row: bundle.kernel.probability(row)[0])
+            drift_monitor.observe(bundle, input_data)
             percentage = round(prediction * 100, 2)  # Convert to percentage
             score = int(percentage)
-            risk_level = 'Low'
-            if percentage > 66.67:
-                risk_level = 'High'
-            elif percentage > 33.33:
-                risk_level = 'Medium'
+            risk_level = risk_level_for(percentage)
             message = f"ADHD Confidence Score: {round(prediction, 2)}. Higher scores may suggest attention challenges. Consult a professional for advice."
 
             # Save to database
@@ -276,14 +465,20 @@ def checklist():
             if conn:
                 cursor = conn.cursor()
                 try:
-                    cursor.execute("""
-                        INSERT INTO results (user_id, score, percentage, message, risk_level, responses)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                    """, (session['user_id'], score, percentage, message, risk_level, str(data)))
-                    conn.commit()
+                    with metrics.stage('db_insert'):
+                        # Summary counters move in the same transaction as the row itself
+                        record_result(cursor, session['user_id'], percentage, risk_level)
+                        cursor.execute("""
+                            INSERT INTO results (user_id, score, percentage, message, risk_level, responses, model_version)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s)
+                        """, (session['user_id'], score, percentage, message, risk_level, json.dumps(data), bundle.version))
+                        conn.commit()
                     result_id = cursor.lastrowid
-                    log_user_activity(session['user_id'], 'prediction', f"Predicted ADHD Confidence Score: {percentage}")
+                    recent_results_cache.invalidate(session['user_id'])
+                    with metrics.stage('activity_log'):
+                        log_user_activity(session['user_id'], 'prediction', f"Predicted ADHD Confidence Score: {percentage}")
                 except pymysql.MySQLError as err:
+                    metrics.error('db')
                     flash(f"Error saving result: {err}", 'error')
                     return redirect(url_for('checklist'))
                 finally:
@@ -293,31 +488,115 @@ def checklist():
             # Redirect to result page
             return redirect(url_for('result', result_id=result_id))
         except Exception as e:
+            metrics.error('prediction')
             flash(f"Prediction error: {str(e)}", 'error')
             return redirect(url_for('checklist'))
 
     return render_template('checklist.html', features=features)
 
+@app.route('/cpt/session', methods=['POST'])
+@login_required
+def cpt_start():
+    # A fresh live CPT run; its running counts travel in the (server-side) session between batches
+    session_id = os.urandom(8).hex()
+    session['cpt'] = dict(LiveCPTScorer().to_state(), session_id=session_id)
+    return jsonify({'session_id': session_id, 'trials': CPT_TRIALS, 'received': 0})
+
+@app.route('/cpt/session')
+@login_required
+def cpt_status():
+    state = session.get('cpt')
+    if not state:
+        return jsonify({'error': 'No CPT session in progress'}), 404
+    return jsonify({'session_id': state['session_id'], 'trials': CPT_TRIALS, 'received': state['received'],
+                    'complete': state['received'] >= CPT_TRIALS})
+
+def cpt_outcome(scorer):
+    # Raw scores, plus a prediction when the bundle's features are all among them
+    features = scorer.features()
+    bundle = get_model_bundle()
+    outcome = {'features': features, 'prediction': None}
+    if not bundle:
+        outcome['missing_features'] = None
+        return outcome
+    missing = [name for name in bundle.features if features.get(name) is None]
+    if bundle.feature_source != 'trials':
+        # Trained on the export's own columns, which these trial-derived scores don't reproduce
+        missing += [name for name in bundle.features if name in EXPORT_MISMATCHED and name not in missing]
+    outcome['missing_features'] = missing
+    if not missing:
+        row = [features[name] for name in bundle.features]
+        with metrics.stage('score'):
+            prediction = prediction_cache.probability(
+                bundle.version, row, lambda r: bundle.kernel.probability(r)[0])
+        drift_monitor.observe(bundle, row)
+        percentage = round(prediction * 100, 2)
+        outcome['prediction'] = {'probability': prediction, 'percentage': percentage,
+                                 'risk_level': risk_level_for(percentage), 'model_version': bundle.version}
+    return outcome
+
+@app.route('/cpt/trials', methods=['POST'])
+@login_required
+def cpt_trials():
+    """Batch of trials for the live CPT: {"session_id", "offset", "trials": [[stimulus, rt_ms], ...]}.
+
+    offset is the 0-based index of the batch's first trial. Trials already received are skipped,
+    so a retried batch is harmless; a gap answers 409 with the count received so the client can
+    resend from there.
+    """
+    data = request.get_json(silent=True) or {}
+    state = session.get('cpt')
+    if not state or data.get('session_id') != state['session_id']:
+        return jsonify({'error': 'Unknown or expired CPT session'}), 404
+    trials, offset = data.get('trials'), data.get('offset')
+    if not isinstance(trials, list) or not isinstance(offset, int) or offset < 0:
+        return jsonify({'error': 'Expected an integer offset and a list of [stimulus, rt] trials'}), 400
+    received = state['received']
+    if offset > received:
+        return jsonify({'error': 'Trials missing before this batch', 'received': received}), 409
+
+    scorer = LiveCPTScorer.from_state(state)
+    new = trials[received - offset:]
+    if received + len(new) > CPT_TRIALS:
+        return jsonify({'error': f'The CPT has {CPT_TRIALS} trials', 'received': received}), 400
+    try:
+        with metrics.stage('cpt_update'):
+            for trial in new:
+                if not isinstance(trial, (list, tuple)) or len(trial) != 2:
+                    raise TrialError(f'Trial {scorer.received + 1}: expected [stimulus, rt]')
+                scorer.add(*trial)
+    except TrialError as e:
+        # Nothing from a rejected batch is kept
+        metrics.error('invalid_trial')
+        return jsonify({'error': str(e), 'received': received}), 400
+    if new:
+        session['cpt'] = dict(scorer.to_state(), session_id=state['session_id'])
+
+    response = {'session_id': state['session_id'], 'received': scorer.received, 'complete': scorer.complete}
+    if scorer.complete:
+        response.update(cpt_outcome(scorer))
+        if new:
+            log_user_activity(session['user_id'], 'cpt_completed', f"Live CPT session {state['session_id']}")
+    return jsonify(response)
+
 @app.route('/profile')
 @login_required
 def profile():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE id = %s", (session['user_id'],))
-    user = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    return render_template('profile.html', user=user)
+    return render_template('profile.html', user=current_user())
 
 @app.route('/result/<int:result_id>')
 @login_required
 def result(result_id):
+    result = None
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM results WHERE id = %s AND user_id = %s", (result_id, session['user_id']))
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    if conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT * FROM results WHERE id = %s AND user_id = %s", (result_id, session['user_id']))
+            result = cursor.fetchone()
+        finally:
+            cursor.close()
+            conn.close()
     return render_template('result.html', result=result)
 
 @app.route('/privacy-policy')
@@ -329,9 +608,101 @@ def logout():
     if 'user_id' in session:
         log_user_activity(session['user_id'], 'logout')
     session.clear()
+    session.regenerate()  # the logged-out session (now only the flash below) gets a fresh ID
     flash('You have been logged out.', 'info')
     return redirect(url_for('login'))
 
+def collect_runtime_gauges():
+    pool = db_pool.stats()
+    log = activity_log.stats()
+    cache = recent_results_cache.stats()
+    predictions = prediction_cache.stats()
+    return [
+        ('db_pool_connections', (('state', 'in_use'),), pool['in_use']),
+        ('db_pool_connections', (('state', 'idle'),), pool['idle']),
+        ('db_pool_checkouts', (), pool['checkouts']),
+        ('db_pool_checkout_timeouts', (), pool['timeouts']),
+        ('db_pool_wait_seconds_total', (), pool['wait_time_total']),
+        ('db_pool_leaked_connections', (), pool['leaked']),
+        ('activity_log_pending', (), log['pending']),
+        ('activity_log_dropped', (), log['dropped']),
+        ('results_cache_hit_rate', (), cache['hit_rate']),
+        ('prediction_cache_hit_rate', (), predictions['hit_rate']),
+        ('prediction_cache_entries', (), predictions['size']),
+        ('drift_observations', (), drift_monitor.stats()['observations']),
+    ]
+
+metrics.add_collector(collect_runtime_gauges)
+
+@app.route('/admin/db-pool')
+@admin_required
+def db_pool_stats():
+    return jsonify(db_pool.stats())
+
+@app.route('/admin/activity-log')
+@admin_required
+def activity_log_stats():
+    return jsonify(activity_log.stats())
+
+@app.route('/admin/password-hasher')
+@admin_required
+def password_hasher_stats():
+    return jsonify(password_hasher.stats())
+
+@app.route('/admin/sessions')
+@admin_required
+def session_stats():
+    return jsonify({**session_store.stats(), 'user_cache': user_cache.stats()})
+
+@app.route('/admin/users/<int:user_id>/invalidate', methods=['POST'])
+@admin_required
+def invalidate_user(user_id):
+    # For users rows changed outside the app; the next request reloads the record
+    user_cache.invalidate(user_id)
+    return jsonify({'invalidated': user_id})
+
+@app.route('/admin/results-cache')
+@admin_required
+def results_cache_stats():
+    return jsonify(recent_results_cache.stats())
+
+@app.route('/admin/stats')
+@admin_required
+def result_stats():
+    # Served from the incrementally maintained summary tables; cost doesn't grow with results
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'Database unavailable'}), 503
+    cursor = conn.cursor()
+    try:
+        return jsonify(read_summary(cursor, request.args.get('days', 30, type=int)))
+    finally:
+        cursor.close()
+        conn.close()
+
+@app.route('/admin/results/export')
+@admin_required
+def export_results_route():
+    # Streams every matching row as CSV or NDJSON on a connection of its own (not from the pool)
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    user_id = request.args.get('user_id', type=int)
+    chunks = export_results(connect_db, fmt, request.args.get('since'), request.args.get('until'), user_id)
+    try:
+        # Run the query before answering so a database error is still a proper error response
+        first = next(chunks, '')
+    except pymysql.MySQLError as err:
+        metrics.error('db')
+        return jsonify({'error': f'Export failed: {err}'}), 503
+
+    def stream():
+        yield first
+        yield from chunks
+
+    return Response(stream(), mimetype=EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename=results.{fmt}'})
+
 @app.errorhandler(404)
 def not_found(e):
     return render_template('404.html'), 404
@@ -342,10 +713,11 @@ def server_error(e):
 
 @app.context_processor
 def inject_user():
+    user = current_user() if session.get('logged_in') else None
     return dict(
         logged_in=session.get('logged_in', False),
-        user_name=session.get('user_name', ''),
-        user_email=session.get('user_email', '')
+        user_name=user['name'] if user else '',
+        user_email=user['email'] if user else ''
     )
 
 if __name__ == '__main__':
@@ -0,0 +1,490 @@
+"""Reproducible benchmarks for the scoring and persistence hot paths.
+
+Drives /login, /dashboard, /checklist (app.py) and /predict (predictApp.py) through the Flask test
+client, sequentially for latency percentiles and from a thread pool for throughput. Also times the
+individual steps (parsing, scaling, prediction, DB insert) on their own. MySQL is replaced by a
+SQLite-backed stand-in with optional per-round-trip latency, so no database server is needed.
+
+    python benchmark.py -o bench.json
+    python benchmark.py -o new.json --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import queue
+import random
+import re
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pymysql
+from jinja2 import ChoiceLoader, DictLoader
+from werkzeug.security import generate_password_hash
+
+import cptFeatures
+
+SAMPLE_CSV = 'adhdTest.csv'
+BENCH_PASSWORD = 'bench-password'
+
+SQLITE_SCHEMA = """
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        age INTEGER,
+        gender TEXT DEFAULT 'Other',
+        phone TEXT,
+        address TEXT,
+        is_active BOOLEAN DEFAULT TRUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        score INTEGER NOT NULL,
+        percentage REAL NOT NULL,
+        message TEXT,
+        risk_level TEXT DEFAULT 'Low',
+        responses TEXT,
+        model_version TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX idx_results_user_created ON results (user_id, created_at);
+    CREATE TABLE result_stats (
+        stat TEXT PRIMARY KEY,
+        results INTEGER NOT NULL DEFAULT 0,
+        percentage_sum REAL NOT NULL DEFAULT 0
+    );
+    CREATE TABLE result_daily_stats (
+        day DATE PRIMARY KEY,
+        results INTEGER NOT NULL DEFAULT 0,
+        percentage_sum REAL NOT NULL DEFAULT 0
+    );
+    CREATE TABLE result_users (
+        user_id INTEGER PRIMARY KEY,
+        results INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE user_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        action TEXT,
+        details TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+# Minimal stand-ins for the HTML templates, which are not part of this repository
+STUB_TEMPLATES = {
+    name: '{{ user_name }}{% for r in recent_results or [] %}{{ r.id }}{% endfor %}{{ result }}{{ user }}'
+    for name in ['index.html', 'login.html', 'dashboard.html', 'checklist.html', 'profile.html',
+                 'result.html', 'privacy-policy.html', '404.html', '500.html']
+}
+
+
+def to_sqlite(sql):
+    # Placeholders, and MySQL's upsert spelled the SQLite way
+    sql = sql.replace('%s', '?').replace('ON DUPLICATE KEY UPDATE', 'ON CONFLICT DO UPDATE SET')
+    return re.sub(r'VALUES\((\w+)\)', r'excluded.\1', sql)
+
+
+class FakeCursor:
+    def __init__(self, conn, tuples=False):
+        self._conn = conn
+        self._cursor = conn._db.cursor()
+        self._tuples = tuples  # pymysql's plain (SS)Cursor returns tuples, DictCursor dicts
+
+    def execute(self, sql, params=()):
+        self._conn.round_trip()
+        if sql.lstrip().upper().startswith('SET '):
+            return 0  # MySQL session settings have no SQLite equivalent
+        try:
+            self._cursor.execute(to_sqlite(sql), tuple(params or ()))
+        except sqlite3.IntegrityError as e:
+            # Surface UNIQUE violations the way pymysql does (ER_DUP_ENTRY)
+            raise pymysql.err.IntegrityError(1062, str(e)) from e
+        return self._cursor.rowcount
+
+    def executemany(self, sql, rows):
+        self._conn.round_trip()
+        self._cursor.executemany(to_sqlite(sql), [tuple(r) for r in rows])
+        return self._cursor.rowcount
+
+    def _rows(self, rows):
+        return [tuple(r.values()) for r in rows] if self._tuples else rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return tuple(row.values()) if self._tuples and row is not None else row
+
+    def fetchmany(self, size):
+        return self._rows(self._cursor.fetchmany(size))
+
+    def fetchall(self):
+        return self._rows(self._cursor.fetchall())
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class FakeMySQLConnection:
+    """Just enough of a pymysql DictCursor connection, backed by a SQLite file."""
+
+    def __init__(self, path, latency=0.0):
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.row_factory = lambda cur, row: {d[0]: v for d, v in zip(cur.description, row)}
+        self.latency = latency
+
+    def round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def cursor(self, cursorclass=None):
+        return FakeCursor(self, tuples=cursorclass is not None and 'Dict' not in cursorclass.__name__)
+
+    def commit(self):
+        self.round_trip()
+        self._db.commit()
+
+    def rollback(self):
+        self._db.rollback()
+
+    def ping(self, reconnect=False):
+        self.round_trip()
+
+    def close(self):
+        self._db.close()
+
+
+def create_fake_database(latency=0.0):
+    path = os.path.join(tempfile.mkdtemp(prefix='adhd-bench-'), 'bench.sqlite3')
+    db = sqlite3.connect(path)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.executescript(SQLITE_SCHEMA)
+    db.close()
+    return lambda: FakeMySQLConnection(path, latency)
+
+
+def seed_users(connect, n_users, seed):
+    rng = random.Random(seed)
+    hashed = generate_password_hash(BENCH_PASSWORD)  # one KDF run, shared by all synthetic users
+    users = [(f'Bench User {i}', f'bench{i}@example.com', hashed, rng.randint(18, 65),
+              rng.choice(['Male', 'Female', 'Other'])) for i in range(n_users)]
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.executemany("INSERT INTO users (name, email, password, age, gender) VALUES (%s, %s, %s, %s, %s)", users)
+    conn.commit()
+    conn.close()
+    return [u[1] for u in users]
+
+
+class FeatureSampler:
+    """Feature vectors resampled from adhdTest.csv rows with Gaussian jitter (5% of each feature's SD)."""
+
+    def __init__(self, features, seed):
+        frame = cptFeatures.read_export(SAMPLE_CSV, usecols=lambda c: c in set(features))
+        self.features = list(features)
+        self.rows = frame[self.features].dropna().to_numpy(dtype=float)
+        self.sd = self.rows.std(axis=0)
+        self.rng = np.random.default_rng(seed)
+
+    def matrix(self, n):
+        picks = self.rows[self.rng.integers(0, len(self.rows), n)]
+        return picks + self.rng.standard_normal(picks.shape) * self.sd * 0.05
+
+    def records(self, n):
+        return [dict(zip(self.features, row.tolist())) for row in self.matrix(n)]
+
+
+def summarize(latencies, errors, wall):
+    ms = np.asarray(latencies) * 1000.0
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'mean_ms': round(float(ms.mean()), 4) if len(ms) else None,
+        'p50_ms': round(float(np.percentile(ms, 50)), 4) if len(ms) else None,
+        'p95_ms': round(float(np.percentile(ms, 95)), 4) if len(ms) else None,
+        'p99_ms': round(float(np.percentile(ms, 99)), 4) if len(ms) else None,
+        'rps': round(len(latencies) / wall, 2) if wall > 0 else None
+    }
+
+
+def run_route(make_client, call, n_requests, concurrency, ok_status=(200, 302)):
+    """Time `call(client, i)` sequentially on one client, then concurrently with one client per thread.
+
+    Every client is made (and logged in, a password KDF each) before its timed window starts.
+    """
+    client = make_client()
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for i in range(n_requests):
+        t0 = time.perf_counter()
+        status = call(client, i).status_code
+        latencies.append(time.perf_counter() - t0)
+        errors += status not in ok_status
+    sequential = summarize(latencies, errors, time.perf_counter() - start)
+
+    local = threading.local()
+    lock = threading.Lock()
+    latencies, errors = [], 0
+    clients = queue.SimpleQueue()
+    for _ in range(concurrency):
+        clients.put(make_client())
+
+    def worker(i):
+        nonlocal errors
+        if not hasattr(local, 'client'):
+            local.client = clients.get_nowait()
+        t0 = time.perf_counter()
+        status = call(local.client, i).status_code
+        elapsed = time.perf_counter() - t0
+        with lock:
+            latencies.append(elapsed)
+            errors += status not in ok_status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(n_requests)))
+    concurrent = summarize(latencies, errors, time.perf_counter() - start)
+    concurrent['concurrency'] = concurrency
+    return {'sequential': sequential, 'concurrent': concurrent}
+
+
+def time_call(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, 0, sum(latencies))
+
+
+def bench_routes(args, connect, emails, sampler):
+    import app as web_app
+    import predictApp
+    from dbPool import ConnectionPool
+
+    web_app.db_pool = ConnectionPool(connect, max_size=args.pool_size, on_round_trip=web_app.count_db_round_trip)
+    for flask_app in (web_app.app, predictApp.app):
+        flask_app.jinja_loader = ChoiceLoader([DictLoader(STUB_TEMPLATES), flask_app.jinja_loader])
+        flask_app.testing = True
+
+    rng = random.Random(args.seed)
+    counter = iter(range(10 ** 9))
+
+    def logged_in_client():
+        client = web_app.app.test_client()
+        client.post('/login', data={'email': emails[next(counter) % len(emails)], 'password': BENCH_PASSWORD})
+        return client
+
+    records = sampler.records(args.requests)
+    checklist_forms = [{f: str(v) for f, v in r.items()} for r in records]
+
+    routes = {
+        '/login': run_route(
+            web_app.app.test_client,
+            lambda c, i: c.post('/login', data={'email': rng.choice(emails), 'password': BENCH_PASSWORD}),
+            args.login_requests, args.concurrency),
+        '/dashboard': run_route(logged_in_client, lambda c, i: c.get('/dashboard'), args.requests, args.concurrency),
+        '/checklist': run_route(logged_in_client, lambda c, i: c.post('/checklist', data=checklist_forms[i]),
+                                args.requests, args.concurrency),
+        '/predict': run_route(predictApp.app.test_client,
+                              lambda c, i: c.post('/predict', json={'features': records[i]}),
+                              args.requests, args.concurrency, ok_status=(200,)),
+    }
+    return routes
+
+
+def bench_login_storm(args, emails):
+    """Hammer /login from many threads and time /dashboard alongside, with inline and pooled KDFs."""
+    import app as web_app
+    from passwordHasher import PasswordHasher
+
+    # Dashboard client logged in up front so its own login isn't part of the measurement
+    probe = web_app.app.test_client()
+    probe.post('/login', data={'email': emails[0], 'password': BENCH_PASSWORD})
+
+    def dashboard_latencies(stop, out):
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            probe.get('/dashboard')
+            out.append(time.perf_counter() - t0)
+            time.sleep(0.002)
+
+    idle, stop = [], threading.Event()
+    timer = threading.Timer(1.0, stop.set)
+    timer.start()
+    dashboard_latencies(stop, idle)
+    results = {'dashboard_idle': summarize(idle, 0, 1.0)}
+
+    configs = {'inline': dict(web_app.KDF_CONFIG, max_workers=0), 'pooled': web_app.KDF_CONFIG}
+    original = web_app.password_hasher
+    try:
+        for name, config in configs.items():
+            web_app.password_hasher = PasswordHasher(**config)
+            local, lock = threading.local(), threading.Lock()
+            latencies, errors = [], 0
+
+            def login(i):
+                nonlocal errors
+                if not hasattr(local, 'client'):
+                    local.client = web_app.app.test_client()
+                t0 = time.perf_counter()
+                response = local.client.post('/login', data={'email': emails[i % len(emails)],
+                                                             'password': BENCH_PASSWORD})
+                elapsed = time.perf_counter() - t0
+                with lock:
+                    latencies.append(elapsed)
+                    errors += '/dashboard' not in response.headers.get('Location', '')
+
+            during, stop = [], threading.Event()
+            prober = threading.Thread(target=dashboard_latencies, args=(stop, during))
+            prober.start()
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.storm_concurrency) as pool:
+                list(pool.map(login, range(args.storm_logins)))
+            wall = time.perf_counter() - start
+            stop.set()
+            prober.join()
+            results[name] = {
+                'kdf_workers': config['max_workers'],
+                'login': dict(summarize(latencies, errors, wall), concurrency=args.storm_concurrency),
+                'dashboard_during_storm': summarize(during, 0, wall),
+                'hasher': web_app.password_hasher.stats()
+            }
+    finally:
+        web_app.password_hasher = original
+    return results
+
+
+def bench_micro(args, connect, sampler):
+    from modelBundle import load_bundle
+
+    bundle = load_bundle()
+    features = bundle.features
+    form = {f: str(v) for f, v in sampler.records(1)[0].items()}
+    row = np.array([[float(form[f]) for f in features]])
+    batch = sampler.matrix(1000)
+    conn = connect()
+    repeat = args.micro_repeat
+
+    def insert_result():
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO results (user_id, score, percentage, message, risk_level, responses, model_version)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, (1, 50, 50.0, 'bench', 'Medium', json.dumps(form), bundle.version))
+        conn.commit()
+        cursor.close()
+
+    micro = {
+        'parse_form': time_call(lambda: [float(form[f]) for f in features], repeat),
+        'scaler_transform': time_call(lambda: bundle.scaler.transform(row), repeat),
+        'sklearn_predict': time_call(lambda: bundle.model.predict(bundle.scaler.transform(row)), repeat),
+        'kernel_probability': time_call(lambda: bundle.kernel.probability(row), repeat),
+        'kernel_probability_1000_rows': time_call(lambda: bundle.kernel.probability(batch), max(repeat // 10, 1)),
+        'db_insert_result': time_call(insert_result, repeat),
+    }
+    conn.close()
+    return micro
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path):
+    # Print the p50 / rps change of each benchmark against an earlier run
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\n📈 Compared with {baseline_path} ({baseline['meta'].get('commit')}):")
+    pairs = [(f'{route} {mode}', current['routes'][route][mode], baseline['routes'].get(route, {}).get(mode))
+             for route in current['routes'] for mode in ('sequential', 'concurrent')]
+    pairs += [(name, stats, baseline['micro'].get(name)) for name, stats in current['micro'].items()]
+    for name, new, old in pairs:
+        if not old or not old.get('p50_ms') or not new.get('p50_ms'):
+            continue
+        change = (new['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100
+        print(f"  {name:<32} p50 {old['p50_ms']:>10.4f} -> {new['p50_ms']:>10.4f} ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ADHD screening hot paths")
+    parser.add_argument('-o', '--output', default='bench_results.json')
+    parser.add_argument('--compare', help="earlier results JSON to compare against")
+    parser.add_argument('--requests', type=int, default=500, help="requests per route")
+    parser.add_argument('--login-requests', type=int, default=50, help="requests for /login (KDF-bound)")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--pool-size', type=int, default=10)
+    parser.add_argument('--db-latency-ms', type=float, default=0.0, help="simulated latency per DB round trip")
+    parser.add_argument('--micro-repeat', type=int, default=2000)
+    parser.add_argument('--storm-logins', type=int, default=64, help="logins fired during the login storm")
+    parser.add_argument('--storm-concurrency', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    connect = create_fake_database(args.db_latency_ms / 1000.0)
+    emails = seed_users(connect, args.users, args.seed)
+    from modelBundle import load_bundle
+    sampler = FeatureSampler(load_bundle().features, args.seed)
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': vars(args)
+        },
+        'routes': bench_routes(args, connect, emails, sampler),
+        'login_storm': bench_login_storm(args, emails),
+        'micro': bench_micro(args, connect, sampler)
+    }
+    import app as web_app
+    web_app.activity_log.shutdown()
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    for route, modes in results['routes'].items():
+        for mode, s in modes.items():
+            print(f"🚦 {route:<12} {mode:<10} p50 {s['p50_ms']:.3f} ms  p95 {s['p95_ms']:.3f} ms  "
+                  f"p99 {s['p99_ms']:.3f} ms  {s['rps']} req/s  errors {s['errors']}")
+    storm = results['login_storm']
+    print(f"🌩️  /dashboard idle p50 {storm['dashboard_idle']['p50_ms']:.3f} ms  "
+          f"p99 {storm['dashboard_idle']['p99_ms']:.3f} ms")
+    for name in ('inline', 'pooled'):
+        login, page = storm[name]['login'], storm[name]['dashboard_during_storm']
+        print(f"🌩️  {name:<7} KDF: /login {login['rps']} req/s (p99 {login['p99_ms']:.1f} ms, "
+              f"errors {login['errors']}); /dashboard during storm p50 {page['p50_ms']:.3f} ms  "
+              f"p99 {page['p99_ms']:.3f} ms")
+    for name, s in results['micro'].items():
+        print(f"🔬 {name:<30} p50 {s['p50_ms']:.4f} ms  p99 {s['p99_ms']:.4f} ms")
+    print(f"✅ Results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
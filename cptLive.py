@@ -0,0 +1,146 @@
+"""Live CPT-II scoring: trials are folded into running counts as they arrive from the browser.
+
+Each trial costs O(1): it bumps the omission/commission/perseveration counters and, for a hit,
+updates Welford mean/variance accumulators for the whole test, its block and its sub-block.
+Perseverations (target responses under 100 ms) go into plain count/sum/sum-of-squares
+accumulators for the same groups, because the SE scores measure every target response
+about the hit mean.
+After the 360th trial the raw scores come straight from those accumulators through the same
+formulas as the batch extractor (cptScores.features_from_moments), with nothing left to rescan.
+
+The state is a small dict of plain numbers (to_state/from_state), so app.py keeps it in the
+server-side session between the browser's batched POSTs.
+"""
+import math
+
+import numpy as np
+
+from cptScores import (MIN_HIT_RT, N_BLOCKS, N_SUBBLOCKS, N_TRIALS, NO_RESPONSE, NONTARGET,
+                         features_from_moments)
+
+TRIALS_PER_BLOCK = N_TRIALS // N_BLOCKS
+TRIALS_PER_SUBBLOCK = N_TRIALS // N_SUBBLOCKS
+MAX_RT = 10000  # ms; anything slower is a client bug, not a response
+
+
+class TrialError(ValueError):
+    pass
+
+
+def _welford(acc, x):
+    # acc = [count, mean, sum of squared deviations]
+    acc[0] += 1
+    delta = x - acc[1]
+    acc[1] += delta / acc[0]
+    acc[2] += delta * (x - acc[1])
+
+
+def _moments(accs, pers):
+    # Per group: target responses, hit mean and RMS deviation of all responses from that mean
+    # (cptScores.features_from_moments); NaN where there were no hits
+    hits = np.array([a[0] for a in accs], dtype=float)
+    p_count, p_sum, p_sumsq = (np.array(column, dtype=float) for column in zip(*pers))
+    count = hits + p_count
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(hits > 0, [a[1] for a in accs], np.nan)
+        # Hits contribute their M2; each perseveration p adds (p - mean)^2
+        deviation = np.array([a[2] for a in accs]) + p_sumsq - 2.0 * mean * p_sum + p_count * mean * mean
+        sd = np.sqrt(np.clip(deviation, 0.0, None) / count)
+    return count, mean, sd
+
+
+class LiveCPTScorer:
+    COUNTERS = ("received", "n_target", "n_nontarget", "omissions", "commissions", "perseverations")
+
+    def __init__(self):
+        self.received = 0
+        self.n_target = self.n_nontarget = 0
+        self.omissions = self.commissions = self.perseverations = 0
+        self.hits = [0, 0.0, 0.0]
+        self.blocks = [[0, 0.0, 0.0] for _ in range(N_BLOCKS)]
+        self.subblocks = [[0, 0.0, 0.0] for _ in range(N_SUBBLOCKS)]
+        # [count, sum, sum of squares] of perseveration RTs, per group as above
+        self.pers_hits = [0, 0.0, 0.0]
+        self.pers_blocks = [[0, 0.0, 0.0] for _ in range(N_BLOCKS)]
+        self.pers_subblocks = [[0, 0.0, 0.0] for _ in range(N_SUBBLOCKS)]
+
+    @property
+    def complete(self):
+        return self.received >= N_TRIALS
+
+    def add(self, stimulus, rt):
+        """Fold in the next trial: its stimulus code and RT in ms (-1 for no response)."""
+        if self.complete:
+            raise TrialError(f"All {N_TRIALS} trials were already received")
+        if isinstance(stimulus, bool) or isinstance(rt, bool):
+            raise TrialError("Stimulus and RT must be integers")
+        try:
+            stimulus, rt = int(stimulus), int(rt)
+        except (TypeError, ValueError):
+            raise TrialError(f"Trial {self.received + 1}: stimulus and RT must be integers") from None
+        if rt != NO_RESPONSE and not 0 <= rt <= MAX_RT:
+            raise TrialError(f"Trial {self.received + 1}: RT must be -1 or 0..{MAX_RT} ms, got {rt}")
+
+        index = self.received
+        self.received += 1
+        if index == 0:
+            return  # the warm-up trial is never scored
+        responded = rt != NO_RESPONSE
+        if stimulus == NONTARGET:
+            self.n_nontarget += 1
+            self.commissions += responded
+            return
+        self.n_target += 1
+        if not responded:
+            self.omissions += 1
+        elif rt < MIN_HIT_RT:
+            self.perseverations += 1
+            for acc in (self.pers_hits, self.pers_blocks[index // TRIALS_PER_BLOCK],
+                        self.pers_subblocks[index // TRIALS_PER_SUBBLOCK]):
+                acc[0] += 1
+                acc[1] += rt
+                acc[2] += rt * rt
+        else:
+            _welford(self.hits, rt)
+            _welford(self.blocks[index // TRIALS_PER_BLOCK], rt)
+            _welford(self.subblocks[index // TRIALS_PER_SUBBLOCK], rt)
+
+    def extend(self, trials):
+        for stimulus, rt in trials:
+            self.add(stimulus, rt)
+
+    def features(self):
+        """Raw scores (cptScores.RAW_FEATURES) from the trials received so far."""
+        n_resp, hit_rt, resp_sd = _moments([self.hits], [self.pers_hits])
+        sub_n, _, sub_sd = _moments(self.subblocks, self.pers_subblocks)
+        block_n, block_rt, block_sd = _moments(self.blocks, self.pers_blocks)
+        scores = features_from_moments(
+            [self.n_target], [self.n_nontarget], [self.omissions], [self.commissions], [self.perseverations],
+            n_resp, hit_rt, resp_sd, sub_n[None], sub_sd[None], block_n[None], block_rt[None], block_sd[None])
+        return {name: _json_float(values[0]) for name, values in scores.items()}
+
+    def to_state(self):
+        state = {name: getattr(self, name) for name in self.COUNTERS}
+        state.update(hits=self.hits, blocks=self.blocks, subblocks=self.subblocks, pers_hits=self.pers_hits,
+                     pers_blocks=self.pers_blocks, pers_subblocks=self.pers_subblocks)
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        scorer = cls()
+        for name in cls.COUNTERS:
+            setattr(scorer, name, int(state[name]))
+        scorer.hits = [int(state["hits"][0]), float(state["hits"][1]), float(state["hits"][2])]
+        scorer.blocks = [[int(n), float(m), float(m2)] for n, m, m2 in state["blocks"]]
+        scorer.subblocks = [[int(n), float(m), float(m2)] for n, m, m2 in state["subblocks"]]
+        n, total, sumsq = state["pers_hits"]
+        scorer.pers_hits = [int(n), float(total), float(sumsq)]
+        scorer.pers_blocks = [[int(n), float(t), float(s2)] for n, t, s2 in state["pers_blocks"]]
+        scorer.pers_subblocks = [[int(n), float(t), float(s2)] for n, t, s2 in state["pers_subblocks"]]
+        return scorer
+
+
+def _json_float(value):
+    # Percentages of zero trials come out NaN; JSON has no NaN
+    value = float(value)
+    return value if math.isfinite(value) else None
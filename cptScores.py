@@ -0,0 +1,115 @@
+"""CPT-II raw scores from trial counts and RT moments, shared by batch and live scoring.
+
+NumPy and the standard library only: app.py imports this (through cptLive.py) at startup, so it
+must not pull in pandas or scipy the way the batch extractor (cptFeatures.py) does.
+"""
+from statistics import NormalDist
+
+import numpy as np
+
+N_TRIALS = 360
+N_BLOCKS = 6           # 6 blocks of 60 trials
+N_SUBBLOCKS = 18       # each block has 3 sub-blocks of 20 trials
+NO_RESPONSE = -1
+NONTARGET = 0          # stimulus code of the "X" the subject must not respond to
+MIN_HIT_RT = 100       # target responses faster than this (ms) are perseverations
+
+RAW_FEATURES = [
+    "Raw Score Omissions", "Percent Omissions",
+    "Raw Score Commissions", "Percent Commissions",
+    "Raw Score HitRT", "Raw Score HitSE", "Raw Score VarSE",
+    "Raw Score DPrime", "Raw Score Beta",
+    "Raw Score Perseverations", "Percent Perseverations",
+    "Raw Score HitRTBlock", "Raw Score HitSEBlock",
+]
+# Raw scores computed here with a different formula than the CPT-II export's own columns (see
+# cptFeatures.py --check); a model must be trained on trial-derived values of these to use them
+EXPORT_MISMATCHED = ("Raw Score DPrime", "Raw Score Beta")
+
+
+def group_moments(rt, mask, n_groups):
+    # Count, mean and population SD of rt[mask] within equal-width trial groups
+    n = rt.shape[0]
+    x = np.where(mask, rt, 0.0).reshape(n, n_groups, -1)
+    m = mask.reshape(n, n_groups, -1)
+    count = m.sum(axis=2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = x.sum(axis=2) / count
+        var = (x * x).sum(axis=2) / count - mean * mean
+    return count, mean, np.sqrt(np.clip(var, 0.0, None))
+
+
+def _log_slope(y):
+    # Least-squares slope of log(y) against group index, per subject
+    x = np.arange(y.shape[1], dtype=float)
+    x -= x.mean()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ly = np.log(y)
+    return (ly * x).sum(axis=1) / (x * x).sum()
+
+
+_inv_cdf = np.frompyfunc(NormalDist().inv_cdf, 1, 1)
+
+
+def _probit(p):
+    # Standard normal quantile per element, like scipy.special.ndtri: -inf/inf at 0/1, NaN outside
+    p = np.asarray(p, dtype=float)
+    z = np.full(p.shape, np.nan)
+    inside = (p > 0.0) & (p < 1.0)
+    z[inside] = _inv_cdf(p[inside]).astype(float)
+    z[p == 0.0] = -np.inf
+    z[p == 1.0] = np.inf
+    return z
+
+
+def features_from_moments(n_target, n_nontarget, omissions, commissions, perseverations,
+                          n_resp, hit_rt, resp_sd, sub_n, sub_sd, block_n, block_rt, block_sd):
+    """Raw scores from per-subject trial counts and RT moments.
+
+    For the whole test, each sub-block and each block: the number of target responses, the mean
+    RT of the hits, and the root mean squared deviation of all target responses from that mean
+    (NaN where the group has no hit). Counts and the overall moments are (subjects,) arrays; the
+    sub-block and block moments are (subjects, 18) and (subjects, 6). Shared by the batch
+    extractor and the live scorer (cptLive.py).
+    """
+    n_target, n_nontarget = np.asarray(n_target, dtype=float), np.asarray(n_nontarget, dtype=float)
+    omissions, commissions = np.asarray(omissions, dtype=float), np.asarray(commissions, dtype=float)
+    perseverations = np.asarray(perseverations, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        hit_se = resp_sd / np.sqrt(n_resp)
+
+        # Variability: SD of the hit-RT standard errors across the sub-blocks that have hits
+        sub_se = sub_sd / np.sqrt(sub_n)
+        _, _, var_se = (a[:, 0] for a in group_moments(sub_se, np.isfinite(sub_se), 1))
+
+        block_se = block_sd / np.sqrt(block_n)
+
+    # Signal detection with the log-linear correction so perfect rates stay finite. CPT-II derives
+    # its DPrime and Beta from more than these totals, so they only approximate the export's.
+    hit_rate = (n_target - omissions + 0.5) / (n_target + 1.0)
+    fa_rate = (commissions + 0.5) / (n_nontarget + 1.0)
+    z_hit, z_fa = _probit(hit_rate), _probit(fa_rate)
+    dprime = z_hit - z_fa
+    beta = np.exp((z_fa ** 2 - z_hit ** 2) / 2.0)
+
+    # Like the export, report 0 rather than NaN for RT scores of sessions without hits
+    hit_rt, hit_se, var_se = np.nan_to_num(hit_rt), np.nan_to_num(hit_se), np.nan_to_num(var_se)
+    rt_block = np.nan_to_num(_log_slope(block_rt))
+    se_block = np.nan_to_num(_log_slope(block_se))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "Raw Score Omissions": omissions,
+            "Percent Omissions": 100.0 * omissions / n_target,
+            "Raw Score Commissions": commissions,
+            "Percent Commissions": 100.0 * commissions / n_nontarget,
+            "Raw Score HitRT": hit_rt,
+            "Raw Score HitSE": hit_se,
+            "Raw Score VarSE": var_se,
+            "Raw Score DPrime": dprime,
+            "Raw Score Beta": beta,
+            "Raw Score Perseverations": perseverations,
+            "Percent Perseverations": 100.0 * perseverations / n_target,
+            "Raw Score HitRTBlock": rt_block,
+            "Raw Score HitSEBlock": se_block,
+        }
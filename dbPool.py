@@ -0,0 +1,226 @@
+"""Bounded, thread-safe pool of database connections (used for pymysql in app.py)."""
+import threading
+import time
+import weakref
+from collections import deque
+
+LEAK_POLL_INTERVAL = 0.1  # seconds between leak checks while a checkout waits for a slot
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class CountingCursor:
+    """Cursor proxy reporting every execute to the pool's on_round_trip hook."""
+
+    def __init__(self, raw, on_round_trip):
+        self._raw = raw
+        self._on_round_trip = on_round_trip
+
+    def execute(self, *args, **kwargs):
+        self._on_round_trip()
+        return self._raw.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._on_round_trip()
+        return self._raw.executemany(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+
+class PooledConnection:
+    """Checked-out connection; close() hands it back to the pool instead of disconnecting.
+
+    One garbage-collected without close() is reported to the pool, which closes the raw
+    connection and frees its slot on the next checkout.
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        # The callback must not reference self; it only queues the raw connection
+        self._finalizer = weakref.finalize(self, pool._leaked.append, raw)
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise AttributeError(f"Connection already returned to the pool ({name})")
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        hook = self._pool.on_round_trip
+        return CountingCursor(cursor, hook) if hook else cursor
+
+    def commit(self):
+        if self._pool.on_round_trip:
+            self._pool.on_round_trip()
+        return self._raw.commit()
+
+    def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._finalizer.detach()
+            self._pool._release(raw, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class ConnectionPool:
+    """Hands out at most `max_size` connections made by `connect()`.
+
+    Idle connections are pinged before reuse once they have been idle for `health_check_after`
+    seconds, connections older than `max_lifetime` seconds are closed and replaced, and a checkout
+    waits at most `checkout_timeout` seconds for a free slot before raising PoolTimeout. A connection
+    dropped without close() is discarded and its slot freed instead of being held forever.
+    `on_round_trip`, if given, is called for every execute/executemany/commit made through a
+    checked-out connection.
+    """
+
+    def __init__(self, connect, max_size=10, checkout_timeout=5.0, max_lifetime=1800, health_check_after=30,
+                 on_round_trip=None):
+        self._connect = connect
+        self.on_round_trip = on_round_trip
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self._idle = deque()  # (raw, created_at, idle_since), most recently used on the right
+        # Raw connections of PooledConnections collected without close(). Appended from GC
+        # finalizers, which may run while this thread holds _cond, so drained by checkouts only
+        self._leaked = deque()
+        self._size = 0        # open connections, idle or checked out
+        self._cond = threading.Condition(threading.Lock())
+        self._stats = dict(checkouts=0, timeouts=0, created=0, recycled=0, failed_health_checks=0,
+                           connect_errors=0, leaked=0, wait_time_total=0.0, wait_time_max=0.0)
+
+    def connection(self):
+        start = time.monotonic()
+        deadline = start + self.checkout_timeout
+        leaked = []
+        try:
+            with self._cond:
+                leaked = self._take_leaked()
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(f"No database connection free within {self.checkout_timeout}s")
+                    # Leaked connections don't notify, so wake up now and then to look for them
+                    self._cond.wait(min(remaining, LEAK_POLL_INTERVAL))
+                    leaked += self._take_leaked()
+                item = self._idle.pop() if self._idle else None
+                if item is None:
+                    self._size += 1  # reserve the slot before connecting outside the lock
+                waited = time.monotonic() - start
+                self._stats['checkouts'] += 1
+                self._stats['wait_time_total'] += waited
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+        finally:
+            for raw in leaked:
+                try:
+                    raw.close()
+                except Exception:
+                    pass
+
+        if item is not None:
+            raw, created_at, idle_since = item
+            if self._usable(raw, created_at, idle_since):
+                return PooledConnection(self, raw, created_at)
+        # Nothing idle, or the idle connection was stale: open a fresh one in the same slot
+        try:
+            raw = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._stats['connect_errors'] += 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats['created'] += 1
+        return PooledConnection(self, raw, time.monotonic())
+
+    def _usable(self, raw, created_at, idle_since):
+        now = time.monotonic()
+        if now - created_at > self.max_lifetime:
+            self._discard(raw, 'recycled')
+            return False
+        if now - idle_since > self.health_check_after:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                self._discard(raw, 'failed_health_checks')
+                return False
+        return True
+
+    def _discard(self, raw, reason):
+        # Close a connection whose slot is about to be reused by the caller
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats[reason] += 1
+
+    def _take_leaked(self):
+        # With _cond held: free the slots of connections whose PooledConnection was never closed.
+        # They may be mid-transaction or mid-result, so they are closed rather than reused
+        leaked = []
+        while self._leaked:
+            try:
+                leaked.append(self._leaked.popleft())
+            except IndexError:
+                break
+        self._size -= len(leaked)
+        self._stats['leaked'] += len(leaked)
+        return leaked
+
+    def _release(self, raw, created_at):
+        # Clear any open transaction so the next borrower starts with a fresh snapshot
+        try:
+            raw.rollback()
+            healthy = time.monotonic() - created_at <= self.max_lifetime
+        except Exception:
+            healthy = False
+        if not healthy:
+            try:
+                raw.close()
+            except Exception:
+                pass
+        with self._cond:
+            if healthy:
+                self._idle.append((raw, created_at, time.monotonic()))
+            else:
+                self._size -= 1
+                self._stats['recycled'] += 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            idle = len(self._idle)
+            stats.update(max_size=self.max_size, size=self._size, idle=idle, in_use=self._size - idle)
+        stats['wait_time_avg'] = stats['wait_time_total'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        return stats
+
+    def close_all(self):
+        # Close idle connections; checked-out ones are closed when they come back past max_lifetime
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for raw, _, _ in idle:
+            try:
+                raw.close()
+            except Exception:
+                pass
@@ -0,0 +1,265 @@
+"""Constant-memory monitor of input drift against the model's training distribution.
+
+A reference profile is written next to the model bundle (`<bundle>.drift.json`) when it is
+trained: per feature, decile bin edges of the training data with the training share of each bin,
+plus mean and SD. Every scored row then bumps one counter per feature in a fixed
+(features, bins) table and adds to shifted running sums, a few microseconds per request.
+report() compares the live histograms with the reference on demand: PSI, the largest CDF gap
+on the reference bins (a binned KS statistic), and the mean shift in reference SDs.
+
+    python driftMonitor.py reference adhdTest.csv                      # profile for the current bundle
+    python driftMonitor.py reference adhdTest.csv --bundle other.joblib --bins 20
+"""
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+DEFAULT_BINS = 10
+PSI_EPSILON = 1e-4
+# Conventional PSI reading: below 0.1 stable, 0.1-0.25 moderate shift, above 0.25 major shift
+PSI_MODERATE = 0.1
+PSI_MAJOR = 0.25
+
+
+def reference_path(bundle_path):
+    return os.path.splitext(bundle_path)[0] + '.drift.json'
+
+
+def _padded_edges(edges):
+    # Ragged per-feature edges -> (features, max_edges) matrix padded with +inf
+    width = max((len(e) for e in edges), default=0)
+    matrix = np.full((len(edges), width), np.inf)
+    for i, e in enumerate(edges):
+        matrix[i, :len(e)] = e
+    return matrix
+
+
+def _bin_counts(X, edges):
+    """(features, bins + 1) counts of X's rows; the last column counts NaN/inf values."""
+    X = np.atleast_2d(np.asarray(X, dtype=float))
+    n_features, width = edges.shape
+    n_bins = width + 1
+    finite = np.isfinite(X)
+    # Bin i holds edges[i-1] <= x < edges[i]; padding edges are +inf and never passed
+    index = (X[:, :, None] >= edges[None, :, :]).sum(axis=2)
+    index = np.where(finite, index, n_bins)
+    flat = (index + np.arange(n_features) * (n_bins + 1)).ravel()
+    return np.bincount(flat, minlength=n_features * (n_bins + 1)).reshape(n_features, n_bins + 1)
+
+
+def build_reference(X, features, bins=DEFAULT_BINS):
+    """Reference profile of a training matrix: quantile bin edges, bin shares, mean and SD per feature."""
+    X = np.asarray(X, dtype=float)
+    if X.ndim != 2 or X.shape[1] != len(features):
+        raise ValueError(f"Expected a (rows, {len(features)}) matrix, got shape {X.shape}")
+    quantiles = np.linspace(0, 1, bins + 1)[1:-1]
+    edges = []
+    for column in X.T:
+        column = column[np.isfinite(column)]
+        edges.append(np.unique(np.quantile(column, quantiles)).tolist() if len(column) else [])
+    counts = _bin_counts(X, _padded_edges(edges))
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'rows': int(len(X)),
+        'features': list(features),
+        'edges': edges,
+        'counts': counts.tolist(),
+        'mean': np.nanmean(X, axis=0).tolist(),
+        'std': np.nanstd(X, axis=0).tolist()
+    }
+
+
+def save_reference(path, reference):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(reference, f)
+    os.replace(path + '.tmp', path)
+
+
+def load_reference(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _status(psi):
+    if psi > PSI_MAJOR:
+        return 'major'
+    if psi > PSI_MODERATE:
+        return 'moderate'
+    return 'stable'
+
+
+class DriftMonitor:
+    """Live per-feature histograms and moments for the bundle being served, reset on a model change.
+
+    Given `workers` (a workerState.WorkerState), report() covers the counts of every worker process
+    serving the same model, and reset() clears them in all of them.
+    """
+
+    def __init__(self, workers=None):
+        self._lock = threading.Lock()
+        self._version = None
+        self._reference = None
+        self._reset_counters()
+        self._workers = workers
+        if workers is not None:
+            workers.register('drift', self._state)
+            workers.subscribe('drift.reset', lambda value: self._clear())
+
+    def _reset_counters(self):
+        ref = self._reference
+        n = len(ref['features']) if ref else 0
+        self._counts = np.zeros((n, self._edges.shape[1] + 2 if ref else 0), dtype=np.int64)
+        self._shifted_sum = np.zeros(n)      # sum of (x - reference mean) over finite values
+        self._shifted_sumsq = np.zeros(n)
+        self._observations = 0
+        self._since = datetime.now().isoformat(timespec='seconds')
+
+    def _switch(self, bundle):
+        # Load the reference profile saved next to this bundle (none -> monitoring off for it)
+        reference = None
+        if bundle.source:
+            try:
+                reference = load_reference(reference_path(bundle.source))
+            except (OSError, ValueError):
+                reference = None
+        if reference is not None and reference.get('features') != list(bundle.features):
+            print(f"⚠️  Drift reference for {bundle.version} lists other features; drift monitoring is off")
+            reference = None
+        self._reference = reference
+        if reference is not None:
+            self._edges = _padded_edges(reference['edges'])
+            self._ref_counts = np.asarray(reference['counts'], dtype=float)
+            self._ref_mean = np.asarray(reference['mean'], dtype=float)
+            self._ref_std = np.asarray(reference['std'], dtype=float)
+        self._version = bundle.version
+        self._reset_counters()
+
+    def observe(self, bundle, X):
+        """Count scored row(s) X (in bundle.features order) for the bundle that scored them."""
+        if bundle.version != self._version:
+            with self._lock:
+                if bundle.version != self._version:
+                    self._switch(bundle)
+        if self._reference is None:
+            return
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        edges, ref_mean = self._edges, self._ref_mean
+        if X.shape[1] != len(ref_mean):
+            return
+        counts = _bin_counts(X, edges)
+        shifted = np.where(np.isfinite(X), X - ref_mean, 0.0)
+        with self._lock:
+            if edges is not self._edges:
+                return  # the model changed while this request was being counted
+            self._counts += counts
+            self._shifted_sum += shifted.sum(axis=0)
+            self._shifted_sumsq += (shifted * shifted).sum(axis=0)
+            self._observations += len(X)
+
+    def _clear(self):
+        with self._lock:
+            self._reset_counters()
+
+    def reset(self):
+        if self._workers is not None:
+            self._workers.publish('drift.reset')
+        else:
+            self._clear()
+
+    def _state(self):
+        with self._lock:
+            return {'version': self._version, 'counts': self._counts.tolist(),
+                    'shifted_sum': self._shifted_sum.tolist(), 'shifted_sumsq': self._shifted_sumsq.tolist(),
+                    'observations': self._observations, 'since': self._since}
+
+    def report(self):
+        """Drift scores per feature against the reference, most drifted first; None without a reference."""
+        # Gathered first: it applies any reset another worker published before this one is read
+        others = self._workers.gather('drift', setting='drift.reset') if self._workers is not None else {}
+        with self._lock:
+            if self._reference is None:
+                return None
+            counts = self._counts.astype(float)
+            shifted_sum, shifted_sumsq = self._shifted_sum.copy(), self._shifted_sumsq.copy()
+            observations, since, reference = self._observations, self._since, self._reference
+            ref_counts, ref_mean, ref_std = self._ref_counts, self._ref_mean, self._ref_std
+            version = self._version
+        for pid, state in others.items():
+            other = np.asarray(state['counts'], dtype=float)
+            if pid != os.getpid() and state['version'] == version and other.shape == counts.shape:
+                counts += other
+                shifted_sum += state['shifted_sum']
+                shifted_sumsq += state['shifted_sumsq']
+                observations += state['observations']
+                since = min(since, state['since'])
+
+        finite = counts[:, :-1].sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            current = np.clip(counts / counts.sum(axis=1, keepdims=True), PSI_EPSILON, None)
+            expected = np.clip(ref_counts / ref_counts.sum(axis=1, keepdims=True), PSI_EPSILON, None)
+            psi = ((current - expected) * np.log(current / expected)).sum(axis=1)
+            ref_cdf = np.cumsum(ref_counts[:, :-1], axis=1) / ref_counts[:, :-1].sum(axis=1, keepdims=True)
+            ks = np.abs(np.cumsum(counts[:, :-1], axis=1) / finite[:, None] - ref_cdf).max(axis=1)
+            mean = ref_mean + shifted_sum / finite
+            std = np.sqrt(np.clip(shifted_sumsq / finite - (shifted_sum / finite) ** 2, 0.0, None))
+            shift = (mean - ref_mean) / ref_std
+
+        def number(value):
+            value = float(value)
+            return round(value, 6) if np.isfinite(value) else None
+
+        features = []
+        if observations:
+            for i, name in enumerate(reference['features']):
+                features.append({
+                    'feature': name,
+                    'psi': number(psi[i]),
+                    'ks': number(ks[i]),
+                    'status': _status(psi[i]),
+                    'mean': number(mean[i]),
+                    'reference_mean': number(ref_mean[i]),
+                    'std': number(std[i]),
+                    'reference_std': number(ref_std[i]),
+                    'mean_shift_sd': number(shift[i]),
+                    'non_finite': int(counts[i, -1])
+                })
+            features.sort(key=lambda f: -(f['psi'] or 0.0))
+        return {
+            'model_version': version,
+            'reference_created_at': reference.get('created_at'),
+            'reference_rows': reference.get('rows'),
+            'observations': observations,
+            'since': since,
+            'max_psi': features[0]['psi'] if features else None,
+            'drifted': [f['feature'] for f in features if f['status'] != 'stable'],
+            'features': features
+        }
+
+    def stats(self):
+        with self._lock:
+            return {'model_version': self._version, 'has_reference': self._reference is not None,
+                    'observations': self._observations, 'since': self._since}
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the drift reference profile for a model bundle")
+    sub = parser.add_subparsers(dest='command', required=True)
+    ref = sub.add_parser('reference', help="profile the bundle's features in a training export")
+    ref.add_argument('input', help="CPT-II export the model was trained on (semicolon-delimited CSV)")
+    ref.add_argument('--bundle', help="model bundle (default: the one the apps load)")
+    ref.add_argument('--bins', type=int, default=DEFAULT_BINS)
+    args = parser.parse_args()
+
+    from modelBundle import DEFAULT_BUNDLE_PATH, load_bundle
+    from trainModel import load_feature_matrix
+
+    bundle = load_bundle(args.bundle or DEFAULT_BUNDLE_PATH)
+    X, _, _ = load_feature_matrix(args.input, bundle.features)
+    path = reference_path(bundle.source)
+    save_reference(path, build_reference(X, bundle.features, args.bins))
+    print(f"✅ Drift reference for {bundle.version} ({len(X)} rows) saved at: {path}")
@@ -0,0 +1,294 @@
+"""Model kernels that score without sklearn's per-call overhead.
+
+Linear models fold the scaler into one dot product (FusedLinearModel); tree ensembles are
+flattened into node arrays and evaluated for a whole batch with NumPy (CompiledForest).
+"""
+import numpy as np
+from scipy.special import expit
+
+# LinearRegression models predict the CPT-II Adhd Confidence Index on a 0-100 scale
+CONFIDENCE_INDEX_SCALE = 100.0
+
+
+def as_feature_matrix(X, n_features):
+    """(rows, n_features) float matrix of X; raises ValueError on a wrong width or a NaN/inf value.
+
+    sklearn's estimators refuse non-finite input, but the fused and compiled paths would score
+    it (inf saturates a linear score at 0 or 100%), so every kernel checks here instead.
+    """
+    X = np.asarray(X, dtype=float)
+    if X.ndim == 1:
+        X = X[None, :]
+    if X.shape[1] != n_features:
+        raise ValueError(f"Expected {n_features} features, got {X.shape[1]}")
+    finite = np.isfinite(X).all(axis=1)
+    if not finite.all():
+        rows = np.flatnonzero(~finite)
+        raise ValueError(f"Non-finite feature values in {len(rows)} row(s), first at row {rows[0]}")
+    return X
+
+
+class FusedLinearModel:
+    """StandardScaler folded into the coefficients of a LinearRegression or binary LogisticRegression.
+
+    (x - mean) / scale @ coef + intercept == x @ (coef / scale) + (intercept - mean / scale @ coef),
+    so a row or a matrix of raw features is scored with one matrix product (plus a sigmoid).
+    """
+
+    def __init__(self, model, scaler=None):
+        self.model = model
+        self.scaler = scaler
+        self.is_classifier = hasattr(model, "predict_proba")
+        coef = np.asarray(model.coef_, dtype=float)
+        intercept = np.atleast_1d(np.asarray(model.intercept_, dtype=float))
+        if coef.ndim == 2:
+            if coef.shape[0] != 1:
+                raise ValueError(f"Only binary or single-output models can be fused, got coef_ shape {coef.shape}")
+            coef = coef[0]
+        if self.is_classifier and len(model.classes_) != 2:
+            raise ValueError(f"Only binary classifiers can be fused, got classes {list(model.classes_)}")
+        self.classes_ = np.asarray(model.classes_) if self.is_classifier else None
+
+        mean = np.zeros_like(coef)
+        scale = np.ones_like(coef)
+        if scaler is not None:
+            if getattr(scaler, "with_mean", True) and getattr(scaler, "mean_", None) is not None:
+                mean = np.asarray(scaler.mean_, dtype=float)
+            if getattr(scaler, "with_std", True) and getattr(scaler, "scale_", None) is not None:
+                scale = np.asarray(scaler.scale_, dtype=float)
+        self.coef_ = coef / scale
+        self.intercept_ = float(intercept[0] - mean @ self.coef_)
+        self.n_features_in_ = len(self.coef_)
+
+    def decision_function(self, X):
+        return as_feature_matrix(X, self.n_features_in_) @ self.coef_ + self.intercept_
+
+    def probability(self, X):
+        # ADHD probability per row: the positive-class probability for classifiers,
+        # the Adhd Confidence Index rescaled to [0, 1] for regression models
+        z = self.decision_function(X)
+        if self.is_classifier:
+            return expit(z)
+        return np.clip(z / CONFIDENCE_INDEX_SCALE, 0.0, 1.0)
+
+    def predict(self, X):
+        # Same output as model.predict(scaler.transform(X))
+        z = self.decision_function(X)
+        if self.is_classifier:
+            return self.classes_[(z > 0).astype(int)]
+        return z
+
+    def _sklearn_outputs(self, X):
+        Xs = self.scaler.transform(X) if self.scaler is not None else X
+        if self.is_classifier:
+            return self.model.predict_proba(Xs)[:, 1], self.model.predict(Xs)
+        raw = self.model.predict(Xs)
+        return np.clip(raw / CONFIDENCE_INDEX_SCALE, 0.0, 1.0), raw
+
+    def self_test(self, X=None, n_rows=64, atol=1e-6, seed=0):
+        """Check the fused scores against the sklearn scaler + model path; raises ValueError on mismatch.
+
+        Without `X`, rows are sampled around the scaler's mean and spread.
+        """
+        if X is None:
+            rng = np.random.default_rng(seed)
+            mean = getattr(self.scaler, "mean_", None)
+            scale = getattr(self.scaler, "scale_", None)
+            mean = np.zeros(self.n_features_in_) if mean is None else np.asarray(mean, dtype=float)
+            scale = np.ones(self.n_features_in_) if scale is None else np.asarray(scale, dtype=float)
+            X = mean + scale * rng.standard_normal((n_rows, self.n_features_in_))
+        X = as_feature_matrix(X, self.n_features_in_)
+
+        expected_proba, expected_pred = self._sklearn_outputs(X)
+        proba_err = float(np.max(np.abs(self.probability(X) - expected_proba)))
+        if not proba_err <= atol:  # also catches NaN
+            raise ValueError(f"Fused probabilities differ from sklearn by {proba_err:.3g} (tolerance {atol:g})")
+        if self.is_classifier:
+            # Labels may only disagree where the probability sits on the 0.5 boundary
+            mismatch = (self.predict(X) != expected_pred) & (np.abs(expected_proba - 0.5) > atol)
+            if mismatch.any():
+                raise ValueError(f"Fused labels differ from sklearn on {int(mismatch.sum())} rows")
+        else:
+            pred_err = float(np.max(np.abs(self.predict(X) - expected_pred)))
+            if not pred_err <= atol * CONFIDENCE_INDEX_SCALE:
+                raise ValueError(f"Fused predictions differ from sklearn by {pred_err:.3g}")
+        return proba_err
+
+
+def build_fused_model(model, scaler=None, check=True):
+    # Build the fused scorer and, unless disabled, verify it against sklearn before use
+    fused = FusedLinearModel(model, scaler)
+    if check:
+        fused.self_test()
+    return fused
+
+
+class CompiledForest:
+    """A fitted RandomForest/ExtraTrees ensemble flattened into contiguous node arrays.
+
+    Every tree's nodes sit in one set of arrays (feature, threshold, left, right, value), with
+    leaves pointing at themselves. A batch is scored by walking all (row, tree) pairs down one
+    level per step with fancy indexing, so the cost is a few NumPy calls per tree level rather
+    than sklearn's per-tree Python dispatch. Rows are scaled and cast to float32 exactly as the
+    sklearn path does, so the leaves reached (and the probabilities) are the same.
+
+    That wins for the few rows of a request or micro-batch; from SKLEARN_MIN_ROWS rows on
+    (bulk scoring) sklearn's compiled per-tree loops are faster and are used instead.
+    """
+
+    CHUNK_ROWS = 256          # rows traversed together; keeps the (row, tree) arrays in cache
+    SKLEARN_MIN_ROWS = 512
+
+    def __init__(self, model, scaler=None):
+        self.model = model
+        self.scaler = scaler
+        self.is_classifier = hasattr(model, "predict_proba")
+        if self.is_classifier and len(model.classes_) != 2:
+            raise ValueError(f"Only binary forests can be compiled, got classes {list(model.classes_)}")
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("Only single-output forests can be compiled")
+        self.classes_ = np.asarray(model.classes_) if self.is_classifier else None
+        self.n_features_in_ = int(model.n_features_in_)
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset, depth = 0, 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            nodes = np.arange(offset, offset + n)
+            leaf = tree.children_left == -1
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(leaf, nodes, tree.children_left + offset))
+            rights.append(np.where(leaf, nodes, tree.children_right + offset))
+            value = tree.value[:, 0, :]
+            if self.is_classifier:
+                # Positive-class fraction; older sklearn stores counts, newer ones fractions
+                value = value[:, 1] / value.sum(axis=1)
+            else:
+                value = value[:, 0]
+            values.append(value)
+            roots.append(offset)
+            offset += n
+            depth = max(depth, tree.max_depth)
+        self.feature = np.concatenate(features).astype(np.intp)
+        self.threshold = np.concatenate(thresholds).astype(np.float64)
+        self.left = np.concatenate(lefts).astype(np.intp)
+        self.right = np.concatenate(rights).astype(np.intp)
+        self.value = np.concatenate(values).astype(np.float64)
+        self.is_leaf = self.left == np.arange(offset)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.max_depth = depth
+        self.node_count = offset
+
+    def _transform(self, X):
+        X = as_feature_matrix(X, self.n_features_in_)
+        if self.scaler is not None:
+            X = self.scaler.transform(X)
+        # Trees compare float32 features against float64 thresholds
+        return X.astype(np.float32)
+
+    def _leaves(self, Xs):
+        # Leaf index reached by every (row, tree) pair, flattened row-major. Pairs that reach a
+        # leaf drop out, so each level only touches the paths still descending.
+        n_trees = len(self.roots)
+        flat = Xs.ravel()
+        node = np.tile(self.roots, len(Xs))
+        base = np.repeat(np.arange(len(Xs)) * self.n_features_in_, n_trees)
+        active = np.flatnonzero(~self.is_leaf.take(node))
+        while active.size:
+            current = node.take(active)
+            x = flat.take(base.take(active) + self.feature.take(current))
+            go_left = x <= self.threshold.take(current)
+            current = np.where(go_left, self.left.take(current), self.right.take(current))
+            node[active] = current
+            active = active[~self.is_leaf.take(current)]
+        return node.reshape(len(Xs), n_trees)
+
+    def _mean_value(self, X):
+        Xs = self._transform(X)
+        if len(Xs) >= self.SKLEARN_MIN_ROWS:
+            if self.is_classifier:
+                return self.model.predict_proba(Xs)[:, 1]
+            return self.model.predict(Xs)
+        out = np.empty(len(Xs))
+        for start in range(0, len(Xs), self.CHUNK_ROWS):
+            chunk = Xs[start:start + self.CHUNK_ROWS]
+            out[start:start + len(chunk)] = self.value[self._leaves(chunk)].mean(axis=1)
+        return out
+
+    def probability(self, X):
+        value = self._mean_value(X)
+        if self.is_classifier:
+            return value
+        return np.clip(value / CONFIDENCE_INDEX_SCALE, 0.0, 1.0)
+
+    def predict(self, X):
+        value = self._mean_value(X)
+        if self.is_classifier:
+            # argmax over (1 - p, p); ties go to the first class like sklearn
+            return self.classes_[(value > 1.0 - value).astype(int)]
+        return value
+
+    def self_test(self, X=None, n_rows=64, atol=1e-9, seed=0):
+        """Check the compiled forest against predict_proba/predict; raises ValueError on mismatch."""
+        if X is None:
+            rng = np.random.default_rng(seed)
+            mean = getattr(self.scaler, "mean_", None)
+            scale = getattr(self.scaler, "scale_", None)
+            mean = np.zeros(self.n_features_in_) if mean is None else np.asarray(mean, dtype=float)
+            scale = np.ones(self.n_features_in_) if scale is None else np.asarray(scale, dtype=float)
+            X = mean + scale * rng.standard_normal((n_rows, self.n_features_in_))
+        X = np.asarray(X, dtype=float)[:self.SKLEARN_MIN_ROWS - 1]
+        reference = SklearnScorer(self.model, self.scaler)
+        proba_err = float(np.max(np.abs(self.probability(X) - reference.probability(X))))
+        if not proba_err <= atol:  # also catches NaN
+            raise ValueError(f"Compiled forest differs from sklearn by {proba_err:.3g} (tolerance {atol:g})")
+        if self.is_classifier:
+            expected = reference.probability(X)
+            mismatch = (self.predict(X) != reference.predict(X)) & (np.abs(expected - 0.5) > atol)
+            if mismatch.any():
+                raise ValueError(f"Compiled forest labels differ from sklearn on {int(mismatch.sum())} rows")
+        return proba_err
+
+
+def build_compiled_forest(model, scaler=None, check=True):
+    # Compile the forest and, unless disabled, verify it against sklearn before use
+    forest = CompiledForest(model, scaler)
+    if check:
+        forest.self_test()
+    return forest
+
+
+class SklearnScorer:
+    """Same probability() interface for models that are neither linear nor tree ensembles."""
+
+    def __init__(self, model, scaler=None):
+        self.model = model
+        self.scaler = scaler
+        self.is_classifier = hasattr(model, "predict_proba")
+        self.classes_ = np.asarray(model.classes_) if self.is_classifier else None
+        self.n_features_in_ = int(model.n_features_in_)
+
+    def _transform(self, X):
+        X = as_feature_matrix(X, self.n_features_in_)
+        return self.scaler.transform(X) if self.scaler is not None else X
+
+    def probability(self, X):
+        Xs = self._transform(X)
+        if self.is_classifier:
+            return self.model.predict_proba(Xs)[:, 1]
+        return np.clip(self.model.predict(Xs) / CONFIDENCE_INDEX_SCALE, 0.0, 1.0)
+
+    def predict(self, X):
+        return self.model.predict(self._transform(X))
+
+
+def build_scorer(model, scaler=None, check=True):
+    # Fused kernel for linear models, compiled node arrays for forests, plain sklearn otherwise
+    if hasattr(model, "coef_"):
+        return build_fused_model(model, scaler, check=check)
+    estimators = getattr(model, "estimators_", None)
+    if estimators is not None and all(hasattr(e, "tree_") for e in estimators):
+        return build_compiled_forest(model, scaler, check=check)
+    return SklearnScorer(model, scaler)
@@ -0,0 +1,230 @@
+"""Request/stage metrics for the Flask apps, exposed in Prometheus text format.
+
+Every thread records into its own shard, so the hot path takes no lock; /metrics merges the
+shards when it is scraped. Shards of finished threads are folded into a retired shard. With a
+shard directory (see workerState.py) each worker process also writes its totals there, and a
+scrape of any worker sums the counters and histograms of all of them; gauges such as pool sizes
+are reported per worker, with a `worker` label.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, has_request_context, request
+
+from processLocal import after_fork_in_child
+from workerState import WorkerState
+
+# Seconds; covers sub-millisecond scoring up to slow DB writes
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+MAX_LIVE_SHARDS = 256
+
+
+class _Shard:
+    def __init__(self, thread):
+        self.thread = thread
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+
+
+def current_route():
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return 'background' if not has_request_context() else 'unmatched'
+
+
+class _StageTimer:
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe('stage_duration_seconds', time.perf_counter() - self.start,
+                             (('route', current_route()), ('stage', self.stage)))
+        return False
+
+
+class Metrics:
+    def __init__(self, namespace='adhd', buckets=DEFAULT_BUCKETS, shard_dir=None):
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self.help = {}
+        self._collectors = []
+        self._reset()
+        # Other per-worker state (drift, caches, profiler) registers with the same directory
+        self.workers = WorkerState(shard_dir)
+        self.workers.register('metrics', self._export_totals)
+        self.workers.register('gauges', self._collect)
+        # A forked worker starts from zero rather than repeating what the parent recorded
+        after_fork_in_child(self._reset)
+
+    def _reset(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard(None)
+        self._lock = threading.Lock()   # only taken when a thread first records, and on scrape
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(shard)
+                if len(self._shards) > MAX_LIVE_SHARDS:
+                    self._retire_dead()
+            self.workers.start()
+        return shard
+
+    def inc(self, name, labels=(), n=1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + n
+
+    def observe(self, name, value, labels=()):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        hist = histograms.get(key)
+        if hist is None:
+            hist = histograms[key] = [0] * (len(self.buckets) + 2)
+        hist[bisect_left(self.buckets, value)] += 1
+        hist[-1] += value
+
+    def stage(self, name):
+        # with metrics.stage('score'): ...  -> stage_duration_seconds{route=..., stage="score"}
+        return _StageTimer(self, name)
+
+    def error(self, kind):
+        # Errors a route catches itself (and answers with a redirect or 4xx)
+        self.inc('handled_errors_total', (('route', current_route()), ('kind', kind)))
+
+    def add_collector(self, fn):
+        # fn() returns [(name, labels, value), ...] gauges read at scrape time
+        self._collectors.append(fn)
+
+    def _retire_dead(self):
+        live = []
+        for shard in self._shards:
+            if shard.thread.is_alive():
+                live.append(shard)
+            else:
+                self._merge_into(self._retired, shard)
+        self._shards = live
+
+    @staticmethod
+    def _merge_into(target, shard):
+        for key, value in list(shard.counters.items()):
+            target.counters[key] = target.counters.get(key, 0) + value
+        for key, hist in list(shard.histograms.items()):
+            merged = target.histograms.setdefault(key, [0] * len(hist))
+            for i, v in enumerate(hist):
+                merged[i] += v
+
+    def snapshot(self):
+        with self._lock:
+            self._retire_dead()
+            total = _Shard(None)
+            self._merge_into(total, self._retired)
+            for shard in self._shards:
+                self._merge_into(total, shard)
+        return total
+
+    def _format_labels(self, labels, extra=()):
+        pairs = tuple(labels) + tuple(extra)
+        if not pairs:
+            return ''
+        body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+        return '{' + body + '}'
+
+    def _collect(self):
+        return [[name, [list(pair) for pair in labels], value]
+                for collector in self._collectors for name, labels, value in collector()]
+
+    def _export_totals(self):
+        total = self.snapshot()
+        return {'counters': [[name, [list(pair) for pair in labels], value]
+                             for (name, labels), value in total.counters.items()],
+                'histograms': [[name, [list(pair) for pair in labels], hist]
+                               for (name, labels), hist in total.histograms.items()]}
+
+    def _merged(self):
+        # Counters and histograms summed over every worker that has served, gauges per running worker
+        total = _Shard(None)
+        for state in self.workers.gather('metrics').values():
+            shard = _Shard(None)
+            shard.counters = {(name, tuple(map(tuple, labels))): value for name, labels, value in state['counters']}
+            shard.histograms = {(name, tuple(map(tuple, labels))): hist
+                                for name, labels, hist in state['histograms']}
+            self._merge_into(total, shard)
+        gauges = [(name, tuple(map(tuple, labels)) + (('worker', str(pid)),), value)
+                  for pid, state in sorted(self.workers.gather('gauges', live=True).items())
+                  for name, labels, value in state]
+        return total, gauges
+
+    def render(self):
+        total, gauges = self._merged()
+        ns = self.namespace
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            if name not in seen:
+                seen.add(name)
+                if name in self.help:
+                    lines.append(f'# HELP {ns}_{name} {self.help[name]}')
+                lines.append(f'# TYPE {ns}_{name} {kind}')
+
+        for (name, labels), value in sorted(total.counters.items()):
+            header(name, 'counter')
+            lines.append(f'{ns}_{name}{self._format_labels(labels)} {value}')
+        for (name, labels), hist in sorted(total.histograms.items()):
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(self.buckets, hist):
+                cumulative += count
+                lines.append(f'{ns}_{name}_bucket{self._format_labels(labels, (("le", repr(bound)),))} {cumulative}')
+            cumulative += hist[len(self.buckets)]
+            lines.append(f'{ns}_{name}_bucket{self._format_labels(labels, (("le", "+Inf"),))} {cumulative}')
+            lines.append(f'{ns}_{name}_sum{self._format_labels(labels)} {hist[-1]}')
+            lines.append(f'{ns}_{name}_count{self._format_labels(labels)} {cumulative}')
+        for name, labels, value in sorted(gauges, key=lambda gauge: gauge[0]):
+            header(name, 'gauge')
+            lines.append(f'{ns}_{name}{self._format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def instrument(self, app):
+        """Count requests/errors and time every request of `app`, and serve /metrics."""
+        self.help.setdefault('http_requests_total', 'Requests by route, method and status.')
+        self.help.setdefault('http_request_errors_total', 'Requests that returned 5xx.')
+        self.help.setdefault('handled_errors_total', 'Errors caught and reported by the route itself.')
+        self.help.setdefault('http_request_duration_seconds', 'Request latency by route.')
+        self.help.setdefault('stage_duration_seconds', 'Latency of individual hot-path stages.')
+        self.help.setdefault('db_round_trips_total', 'Database round trips by route.')
+
+        @app.before_request
+        def _start_timer():
+            g._metrics_start = time.perf_counter()
+
+        @app.after_request
+        def _record_request(response):
+            start = g.pop('_metrics_start', None)
+            if start is not None:
+                route = current_route()
+                self.observe('http_request_duration_seconds', time.perf_counter() - start, (('route', route),))
+                self.inc('http_requests_total',
+                         (('route', route), ('method', request.method), ('status', str(response.status_code))))
+                if response.status_code >= 500:
+                    self.inc('http_request_errors_total', (('route', route),))
+            return response
+
+        @app.route('/metrics')
+        def metrics_endpoint():
+            return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+        return app
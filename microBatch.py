@@ -0,0 +1,119 @@
+"""Coalesces single-row scoring calls from concurrent requests into one matrix call per batch."""
+import threading
+import time
+
+import numpy as np
+
+from processLocal import ProcessLocal
+
+
+class _Waiter:
+    __slots__ = ('kernel', 'row', 'event', 'result', 'error')
+
+    def __init__(self, kernel, row):
+        self.kernel = kernel
+        self.row = row
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Scores rows with kernel.probability(), batching rows that arrive close together.
+
+    A row arriving while no other row is being scored is scored directly in the caller's thread,
+    so an idle server pays no batching delay. Rows arriving while others are in flight are queued;
+    a background thread scores the queue once it holds `max_batch` rows or its oldest row has
+    waited `max_wait` seconds, one probability() call per kernel, and hands every caller its own
+    result. Callers give up after `result_timeout` seconds.
+    """
+
+    def __init__(self, max_wait=0.002, max_batch=64, result_timeout=5.0):
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.result_timeout = result_timeout
+        self._pending = []
+        self._in_flight = 0
+        self._cond = threading.Condition(threading.Lock())
+        # Started on first use in each process, forked workers included (threads don't survive fork)
+        self._thread = ProcessLocal(self._start_thread)
+        self._stats = dict(direct=0, batched_rows=0, batches=0, max_batch_seen=0, full_batches=0, errors=0)
+
+    def _start_thread(self):
+        with self._cond:
+            self._pending = []
+        thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        thread.start()
+        return thread
+
+    def probability(self, kernel, row):
+        """Probability for one row of raw features, scored alone or as part of a batch."""
+        self._thread.get()
+        # A row the kernel will reject is scored alone, so its error can't fail other callers' batch
+        valid = bool(np.isfinite(np.asarray(row, dtype=float)).all())
+        with self._cond:
+            self._in_flight += 1
+            direct = (self._in_flight == 1 and not self._pending) or not valid
+            if direct:
+                self._stats['direct'] += 1
+            else:
+                waiter = _Waiter(kernel, row)
+                self._pending.append(waiter)
+                self._cond.notify()
+        try:
+            if direct:
+                return float(kernel.probability(np.asarray(row, dtype=float)[None, :])[0])
+            if not waiter.event.wait(self.result_timeout):
+                raise TimeoutError(f"No batch result within {self.result_timeout}s")
+            if waiter.error is not None:
+                raise waiter.error
+            return waiter.result
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.max_wait
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+                self._stats['batches'] += 1
+                self._stats['batched_rows'] += len(batch)
+                self._stats['max_batch_seen'] = max(self._stats['max_batch_seen'], len(batch))
+                if len(batch) == self.max_batch:
+                    self._stats['full_batches'] += 1
+            self._score(batch)
+
+    def _score(self, batch):
+        # Rows queued across a model reload belong to different kernels; score each group separately
+        groups = {}
+        for waiter in batch:
+            groups.setdefault(id(waiter.kernel), []).append(waiter)
+        for waiters in groups.values():
+            try:
+                X = np.asarray([w.row for w in waiters], dtype=float)
+                proba = waiters[0].kernel.probability(X)
+                for waiter, p in zip(waiters, proba.tolist()):
+                    waiter.result = p
+            except Exception as e:
+                with self._cond:
+                    self._stats['errors'] += 1
+                for waiter in waiters:
+                    waiter.error = e
+            for waiter in waiters:
+                waiter.event.set()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(pending=len(self._pending), in_flight=self._in_flight,
+                         max_wait=self.max_wait, max_batch=self.max_batch)
+        stats['mean_batch_size'] = stats['batched_rows'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
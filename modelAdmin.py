@@ -0,0 +1,52 @@
+"""The /admin endpoints for the served model, shared by app.py and predictApp.py.
+
+    /admin/model               loader state: bundle version, source, reloads, watcher
+    /admin/model/reload        POST: load and validate the bundle again, then signal the other workers
+    /admin/prediction-cache    prediction cache stats, summed over the workers
+    /admin/drift               live inputs against the bundle's training profile
+    /admin/drift/reset         POST: start the drift counts over
+"""
+from flask import jsonify
+
+from adminAuth import admin_required
+
+
+def instrument(app, loader, cache, monitor):
+    """Serve the model endpoints of `app` for its BundleLoader, PredictionCache and DriftMonitor."""
+
+    @app.route('/admin/model')
+    @admin_required
+    def model_status():
+        return jsonify(loader.stats())
+
+    @app.route('/admin/model/reload', methods=['POST'])
+    @admin_required
+    def model_reload():
+        # Reload here first so a bad artifact is rejected before any other worker sees it
+        try:
+            bundle = loader.reload()
+        except Exception as e:
+            return jsonify({'error': f'Reload rejected: {e}', **loader.stats()}), 409
+        loader.notify_workers()
+        return jsonify({'reloaded': bundle.version, **loader.stats()})
+
+    @app.route('/admin/prediction-cache')
+    @admin_required
+    def prediction_cache_stats():
+        return jsonify(cache.worker_stats())
+
+    @app.route('/admin/drift')
+    @admin_required
+    def drift_report():
+        report = monitor.report()
+        if report is None:
+            return jsonify({'error': 'No drift reference profile for the loaded model', **monitor.stats()}), 404
+        return jsonify(report)
+
+    @app.route('/admin/drift/reset', methods=['POST'])
+    @admin_required
+    def drift_reset():
+        monitor.reset()
+        return jsonify(monitor.stats())
+
+    return app
@@ -0,0 +1,304 @@
+"""Single versioned artifact holding model, scaler and feature schema, loaded lazily by every entry point.
+
+A bundle is an uncompressed joblib file (so NumPy arrays inside it can be memory-mapped) plus a
+JSON manifest next to it recording the format, version and SHA-256 of the bundle file.
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+from processLocal import ProcessLocal
+
+BUNDLE_FORMAT = 1
+DEFAULT_BUNDLE_PATH = os.environ.get('ADHD_MODEL_BUNDLE', 'model_bundle.joblib')
+
+# Used when no bundle has been built yet
+LEGACY_MODEL_PATH = 'lr_model.pkl'
+LEGACY_SCALER_PATH = 'scaler.pkl'
+LEGACY_FEATURES_PATH = 'features.pkl'
+
+
+class BundleError(Exception):
+    pass
+
+
+def manifest_path(bundle_path):
+    return os.path.splitext(bundle_path)[0] + '.json'
+
+
+def file_sha256(*paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+# Where a bundle's training features came from: the export's own columns, or (for the raw
+# scores) values extracted from its trial columns with cptFeatures, as live CPT scoring computes them
+FEATURE_SOURCES = ('export', 'trials')
+
+
+class ModelBundle:
+    def __init__(self, model, scaler, features, version, sha256, created_at=None, source=None,
+                 feature_source='export'):
+        self.model = model
+        self.scaler = scaler
+        self.features = list(features)
+        self.version = version
+        self.sha256 = sha256
+        self.created_at = created_at
+        self.source = source
+        self.feature_source = feature_source
+        self._kernel = None
+        self._lock = threading.Lock()
+
+    @property
+    def kernel(self):
+        # Fast scorer, built and self-tested on first use
+        if self._kernel is None:
+            with self._lock:
+                if self._kernel is None:
+                    from fusedModel import build_scorer
+                    self._kernel = build_scorer(self.model, self.scaler)
+        return self._kernel
+
+    def manifest(self):
+        return {
+            'format': BUNDLE_FORMAT,
+            'version': self.version,
+            'sha256': self.sha256,
+            'created_at': self.created_at,
+            'model_type': type(self.model).__name__,
+            'n_features': len(self.features),
+            'features': self.features,
+            'feature_source': self.feature_source,
+            'source': self.source
+        }
+
+
+def save_bundle(path, model, scaler, features, version=None, feature_source='export'):
+    """Write model, scaler and features as one bundle plus its manifest; returns the manifest."""
+    import joblib
+
+    if feature_source not in FEATURE_SOURCES:
+        raise ValueError(f"feature_source must be one of {FEATURE_SOURCES}, got {feature_source!r}")
+    created_at = datetime.now().isoformat(timespec='seconds')
+    payload = {
+        'format': BUNDLE_FORMAT,
+        'model': model,
+        'scaler': scaler,
+        'features': list(features),
+        'version': version,
+        'created_at': created_at,
+        'feature_source': feature_source
+    }
+    tmp_path = path + '.tmp'
+    joblib.dump(payload, tmp_path, compress=0)
+    sha256 = file_sha256(tmp_path)
+    bundle = ModelBundle(model, scaler, features, version or sha256[:12], sha256, created_at, source=path,
+                         feature_source=feature_source)
+    with open(manifest_path(path) + '.tmp', 'w') as f:
+        json.dump(bundle.manifest(), f, indent=2)
+    # Manifest first, bundle last: a reader that sees the new bundle also sees its manifest
+    os.replace(manifest_path(path) + '.tmp', manifest_path(path))
+    os.replace(tmp_path, path)
+    return bundle.manifest()
+
+
+def load_bundle(path=DEFAULT_BUNDLE_PATH, mmap=True, verify=True):
+    """Load a bundle, memory-mapping its arrays; falls back to the legacy .pkl files if it doesn't exist."""
+    import joblib
+
+    if not os.path.exists(path):
+        return load_legacy_artifacts()
+    manifest = {}
+    if os.path.exists(manifest_path(path)):
+        with open(manifest_path(path)) as f:
+            manifest = json.load(f)
+    sha256 = file_sha256(path) if verify or not manifest.get('sha256') else manifest['sha256']
+    if verify and manifest.get('sha256') and manifest['sha256'] != sha256:
+        raise BundleError(f"{path} does not match the hash in {manifest_path(path)}")
+
+    payload = joblib.load(path, mmap_mode='r' if mmap else None)
+    if not isinstance(payload, dict) or payload.get('format') != BUNDLE_FORMAT:
+        raise BundleError(f"{path} is not a format {BUNDLE_FORMAT} model bundle")
+    return ModelBundle(payload['model'], payload['scaler'], payload['features'],
+                       payload.get('version') or sha256[:12], sha256, payload.get('created_at'), source=path,
+                       feature_source=payload.get('feature_source', 'export'))
+
+
+def load_legacy_artifacts(model_path=LEGACY_MODEL_PATH, scaler_path=LEGACY_SCALER_PATH,
+                          features_path=LEGACY_FEATURES_PATH):
+    import joblib
+
+    sha256 = file_sha256(model_path, scaler_path, features_path)
+    return ModelBundle(joblib.load(model_path), joblib.load(scaler_path), joblib.load(features_path),
+                       'legacy-' + sha256[:12], sha256, source=model_path)
+
+
+def validate_bundle(bundle, smoke_rows=None):
+    """Smoke-test a freshly loaded bundle before it serves traffic; raises BundleError on failure.
+
+    Builds the kernel (which checks itself against sklearn) and scores `smoke_rows`, or rows
+    sampled around the scaler's statistics, expecting finite probabilities in [0, 1].
+    """
+    try:
+        kernel = bundle.kernel
+        if kernel.n_features_in_ != len(bundle.features):
+            raise BundleError(f"Model expects {kernel.n_features_in_} features, schema lists {len(bundle.features)}")
+        if smoke_rows is None:
+            import numpy as np
+
+            rng = np.random.default_rng(0)
+            mean = np.asarray(getattr(bundle.scaler, 'mean_', np.zeros(len(bundle.features))), dtype=float)
+            scale = np.asarray(getattr(bundle.scaler, 'scale_', np.ones(len(bundle.features))), dtype=float)
+            smoke_rows = mean + scale * rng.standard_normal((32, len(bundle.features)))
+        proba = kernel.probability(smoke_rows)
+        if not ((proba >= 0) & (proba <= 1)).all():
+            raise BundleError("Smoke batch produced probabilities outside [0, 1]")
+    except BundleError:
+        raise
+    except Exception as e:
+        raise BundleError(f"Bundle {bundle.version} failed validation: {e}") from e
+
+
+class BundleLoader:
+    """Loads the bundle on first get() and hands the same object to every caller afterwards.
+
+    With `watch_interval` set, a background thread in each process polls the artifact files and
+    reloads once a change has been stable for one interval. A new bundle is validated first and
+    then swapped in as a whole, so a caller holding the result of get() always sees a matching
+    model/scaler/features triple.
+    """
+
+    def __init__(self, path=DEFAULT_BUNDLE_PATH, watch_interval=None, smoke_rows=None, **load_kwargs):
+        self.path = path
+        self.watch_interval = watch_interval
+        self.smoke_rows = smoke_rows
+        self.load_kwargs = load_kwargs
+        self._bundle = None
+        self._signature = None
+        self._lock = threading.Lock()
+        # One watcher thread per process, started on first get() (threads don't survive fork)
+        self._watcher = ProcessLocal(self._start_watcher)
+        self._stats = dict(reloads=0, failed_reloads=0, last_error=None, last_reload_at=None)
+
+    def source_paths(self):
+        if os.path.exists(self.path):
+            return [self.path, manifest_path(self.path)]
+        return [LEGACY_MODEL_PATH, LEGACY_SCALER_PATH, LEGACY_FEATURES_PATH]
+
+    def _source_signature(self):
+        signature = []
+        for path in self.source_paths():
+            try:
+                st = os.stat(path)
+                signature.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    def get(self):
+        if self.watch_interval:
+            self._watcher.get()
+        bundle = self._bundle
+        if bundle is None:
+            with self._lock:
+                if self._bundle is None:
+                    signature = self._source_signature()
+                    self._bundle = load_bundle(self.path, **self.load_kwargs)
+                    self._signature = signature
+                bundle = self._bundle
+        return bundle
+
+    def reload(self):
+        """Load, validate and atomically swap in the current artifacts; the old bundle stays on failure."""
+        signature = self._source_signature()
+        try:
+            bundle = load_bundle(self.path, **self.load_kwargs)
+            validate_bundle(bundle, self.smoke_rows)
+        except Exception as e:
+            with self._lock:
+                self._signature = signature  # don't retry until the files change again
+                self._stats['failed_reloads'] += 1
+                self._stats['last_error'] = str(e)
+            raise
+        with self._lock:
+            previous = self._bundle
+            self._bundle = bundle
+            self._signature = signature
+            self._stats['reloads'] += 1
+            self._stats['last_error'] = None
+            self._stats['last_reload_at'] = datetime.now().isoformat(timespec='seconds')
+        if previous is None or previous.sha256 != bundle.sha256:
+            print(f"🔄 Model bundle {bundle.version} loaded (was {previous.version if previous else 'none'})")
+        return bundle
+
+    def notify_workers(self):
+        # Bump the artifact mtime so the watchers in every other worker process reload too
+        path = self.source_paths()[0]
+        os.utime(path)
+        with self._lock:
+            self._signature = self._source_signature()
+
+    def _start_watcher(self):
+        thread = threading.Thread(target=self._watch, name='model-bundle-watcher', daemon=True)
+        thread.start()
+        return thread
+
+    def _watch(self):
+        import time
+
+        pending = None
+        while True:
+            time.sleep(self.watch_interval)
+            if self._bundle is None:
+                continue
+            signature = self._source_signature()
+            if signature == self._signature:
+                pending = None
+            elif signature != pending:
+                pending = signature  # still changing (e.g. a copy in progress); wait one more interval
+            else:
+                pending = None
+                try:
+                    self.reload()
+                except Exception as e:
+                    print(f"❌ Model reload rejected: {e}")
+
+    def stats(self):
+        bundle = self._bundle
+        with self._lock:
+            stats = dict(self._stats)
+        stats['version'] = bundle.version if bundle else None
+        stats['sha256'] = bundle.sha256 if bundle else None
+        stats['watch_interval'] = self.watch_interval
+        return stats
+
+
+if __name__ == '__main__':
+    import argparse
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Build or inspect the model bundle")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="bundle model, scaler and feature list into one file")
+    build.add_argument('--model', default=LEGACY_MODEL_PATH)
+    build.add_argument('--scaler', default=LEGACY_SCALER_PATH)
+    build.add_argument('--features', default=LEGACY_FEATURES_PATH)
+    build.add_argument('--version', help="version label (defaults to the content hash)")
+    build.add_argument('-o', '--output', default=DEFAULT_BUNDLE_PATH)
+    info = sub.add_parser('info', help="print a bundle's manifest")
+    info.add_argument('path', nargs='?', default=DEFAULT_BUNDLE_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        manifest = save_bundle(args.output, joblib.load(args.model), joblib.load(args.scaler),
+                               joblib.load(args.features), version=args.version)
+        print(f"✅ Bundle {manifest['version']} written to {args.output}")
+    else:
+        print(json.dumps(load_bundle(args.path).manifest(), indent=2))
@@ -0,0 +1,86 @@
+"""Password hashing and verification on a small, bounded pool of threads.
+
+werkzeug's KDFs (scrypt/pbkdf2) run in OpenSSL with the GIL released, so at most `max_workers`
+of them use CPU at once however many logins arrive together; the remaining request threads stay
+free for cheap pages. When `max_pending` calls are already queued or running, new ones fail fast
+with HasherBusy instead of piling up, and so does a call not answered within `timeout` seconds.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from processLocal import ProcessLocal
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, max_workers=2, max_pending=64, timeout=10.0):
+        # max_workers=0 runs the KDF inline in the calling thread (no pool, no limit)
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        # Created on first use in each process, forked workers included (threads don't survive fork)
+        self._executor = ProcessLocal(lambda: ThreadPoolExecutor(self.max_workers, thread_name_prefix='kdf'))
+        self._lock = threading.Lock()
+        self._stats = dict(hashes=0, checks=0, rejected=0, timed_out=0, kdf_seconds_total=0.0, wait_seconds_total=0.0,
+                           wait_seconds_max=0.0)
+
+    def _pool(self):
+        return self._executor.get()
+
+    def _timed(self, fn, args, queued_at):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            done = time.perf_counter()
+            with self._lock:
+                self._stats['kdf_seconds_total'] += done - started
+                self._stats['wait_seconds_total'] += started - queued_at
+                self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], started - queued_at)
+
+    def _run(self, kind, fn, *args):
+        with self._lock:
+            self._stats[kind] += 1
+        if not self.max_workers:
+            return self._timed(fn, args, time.perf_counter())
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise HasherBusy(f"{self.max_pending} password operations already pending")
+        try:
+            future = self._pool().submit(self._timed, fn, args, time.perf_counter())
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot is held until the KDF finishes, even if this caller stops waiting for it
+        future.add_done_callback(lambda f: self._slots.release())
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            # Still queued: drop it. Already running: the KDF finishes and then frees its slot
+            future.cancel()
+            with self._lock:
+                self._stats['timed_out'] += 1
+            raise HasherBusy(f"Password operation not finished within {self.timeout}s") from None
+
+    def hash(self, password):
+        return self._run('hashes', generate_password_hash, password)
+
+    def check(self, pwhash, password):
+        return self._run('checks', check_password_hash, pwhash, password)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        calls = stats['hashes'] + stats['checks'] - stats['rejected']
+        stats.update(max_workers=self.max_workers, max_pending=self.max_pending,
+                     kdf_ms_avg=stats['kdf_seconds_total'] / calls * 1000 if calls else 0.0,
+                     wait_ms_avg=stats['wait_seconds_total'] / calls * 1000 if calls else 0.0)
+        return stats
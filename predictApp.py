@@ -1,63 +1,226 @@
 from flask import Flask, render_template, request, jsonify
-import pickle
+import io
+import os
 import numpy as np
+import pandas as pd
 from datetime import datetime
+from modelBundle import BundleLoader
+from adminAuth import admin_required
+import modelAdmin
+from metrics import Metrics
+from samplingProfiler import SamplingProfiler
+from microBatch import MicroBatcher
+from predictionCache import PredictionCache
+from driftMonitor import DriftMonitor
 
 app = Flask(__name__)
 
-# Load model, scaler, and features
-model = pickle.load(open("lr_model.pkl", "rb"))
-scaler = pickle.load(open("scaler.pkl", "rb"))
-features = pickle.load(open("features.pkl", "rb"))  # list of feature names
+# Request/stage timers and counters, served on /metrics. Under serve.py with several workers each
+# worker also writes them (and its drift, cache and profiler state) to ADHD_METRICS_DIR, so any
+# worker can answer for all of them
+metrics = Metrics(shard_dir=os.environ.get("ADHD_METRICS_DIR"))
+metrics.instrument(app)
+
+# Off unless enabled here (ADHD_PROFILE=1) or via POST /admin/profiler; profiles 1 in `every`
+# requests to `routes` (all routes when empty) and serves the stacks on /admin/profiler/flamegraph
+PROFILER_CONFIG = {
+    "enabled": os.environ.get("ADHD_PROFILE") == "1",
+    "routes": [r for r in os.environ.get("ADHD_PROFILE_ROUTES", "").split(",") if r],
+    "every": int(os.environ.get("ADHD_PROFILE_EVERY", 100)),
+    "interval": 0.005,
+    "max_stacks": 5000,
+}
+
+profiler = SamplingProfiler(workers=metrics.workers, **PROFILER_CONFIG)
+profiler.instrument(app)
+
+# Model, scaler and features (list of feature names) come from one bundle, loaded on first use
+# and hot-reloaded when the artifact files change
+MODEL_WATCH_INTERVAL = 5.0
+
+model_loader = BundleLoader(watch_interval=MODEL_WATCH_INTERVAL)
+
+MAX_BATCH_ROWS = 10000
+
+# Concurrent /predict rows arriving within max_wait seconds are scored as one matrix (at most
+# max_batch rows); a request arriving while the server is idle is scored directly
+MICRO_BATCH_CONFIG = {
+    "max_wait": 0.002,
+    "max_batch": 64,
+}
+
+micro_batcher = MicroBatcher(**MICRO_BATCH_CONFIG)
+
+# Scores of recently seen feature vectors, per model version
+PREDICTION_CACHE_CONFIG = {
+    "max_entries": 20000,
+    "ttl": 3600.0,
+}
+
+prediction_cache = PredictionCache(workers=metrics.workers, **PREDICTION_CACHE_CONFIG)
+
+# Live feature histograms compared with the bundle's training profile on /admin/drift
+drift_monitor = DriftMonitor(workers=metrics.workers)
+modelAdmin.instrument(app, model_loader, prediction_cache, drift_monitor)
+
+def collect_runtime_gauges():
+    stats = prediction_cache.stats()
+    return [
+        ("prediction_cache_hit_rate", (), stats["hit_rate"]),
+        ("prediction_cache_entries", (), stats["size"]),
+        ("drift_observations", (), drift_monitor.stats()["observations"]),
+    ]
+
+metrics.add_collector(collect_runtime_gauges)
+
+# (min probability, risk level, message), checked from the top
+RISK_LEVELS = [
+    (0.75, "High", "Strong ADHD indicators. Please consult a professional."),
+    (0.40, "Medium", "Moderate signs of ADHD. Further evaluation recommended."),
+    (0.0, "Low", "Unlikely ADHD, but consult a professional if concerned."),
+]
+
+def risk_level_index(proba):
+    # Row index into RISK_LEVELS for every probability
+    thresholds = np.array([t for t, _, _ in RISK_LEVELS])
+    return np.argmax(np.asarray(proba)[:, None] >= thresholds[None, :], axis=1)
+
+def label_probabilities(proba):
+    proba = np.asarray(proba, dtype=float)
+    return (proba >= 0.5).astype(int), proba, risk_level_index(proba)
+
+def score_matrix(kernel, X):
+    # Score and label an (n, len(features)) matrix of raw features in one fused pass
+    return label_probabilities(kernel.probability(X))
 
 @app.route("/")
 def home():
     return render_template("checklist.html")  # or your dashboard page
 
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
 @app.route("/predict", methods=["POST"])
 def predict():
     try:
-        data = request.get_json()  # JSON from frontend (AJAX)
-        user_features = data.get("features", {})
-
-        # Validate all required features are present
-        missing = [f for f in features if f not in user_features]
-        if missing:
-            return jsonify({"error": f"Missing features: {', '.join(missing)}"}), 400
-
-        # Prepare input
-        X = [user_features[f] for f in features]
-        X = np.array([X], dtype=float)
-
-        # Scale input
-        X_scaled = scaler.transform(X)
-
-        # Prediction and probability
-        prediction = model.predict(X_scaled)[0]
-        proba = model.predict_proba(X_scaled)[0][1]  # probability of ADHD
-
-        # Determine risk level
-        if proba >= 0.75:
-            risk_level = "High"
-            message = "Strong ADHD indicators. Please consult a professional."
-        elif proba >= 0.40:
-            risk_level = "Medium"
-            message = "Moderate signs of ADHD. Further evaluation recommended."
-        else:
-            risk_level = "Low"
-            message = "Unlikely ADHD, but consult a professional if concerned."
+        with metrics.stage("parse"):
+            data = request.get_json()  # JSON from frontend (AJAX)
+            user_features = data.get("features", {})
+        bundle = model_loader.get()
+        features = bundle.features
+
+        with metrics.stage("convert"):
+            # Validate all required features are present
+            missing = [f for f in features if f not in user_features]
+            if missing:
+                metrics.error("missing_feature")
+                return jsonify({"error": f"Missing features: {', '.join(missing)}"}), 400
+
+            # Prepare input; strings like "nan" or "inf" parse as floats but are not usable values
+            X = np.array([to_float(user_features[f]) for f in features])
+            invalid = [f for f, x in zip(features, X) if not np.isfinite(x)]
+            if invalid:
+                metrics.error("invalid_feature")
+                return jsonify({"error": f"Invalid values for: {', '.join(invalid)}"}), 400
+
+        # Predict and determine risk level: repeated vectors come from the cache, the rest are
+        # coalesced with concurrent requests
+        with metrics.stage("score"):
+            p = prediction_cache.probability(bundle.version, X,
+                                             lambda row: micro_batcher.probability(bundle.kernel, row))
+            labels, proba, levels = label_probabilities([p])
+        drift_monitor.observe(bundle, X)
+        _, risk_level, message = RISK_LEVELS[levels[0]]
 
         # Response for API (AJAX)
         return jsonify({
-            "prediction": int(prediction),
-            "probability": round(float(proba), 4),
+            "prediction": int(labels[0]),
+            "probability": round(float(proba[0]), 4),
             "risk_level": risk_level,
-            "message": message
+            "message": message,
+            "model_version": bundle.version
         })
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def read_batch_frame():
+    # Records come as JSON ({"records": [{feature: value, ...}, ...]} or a bare list),
+    # a CSV request body, or a CSV file upload named "file"
+    if "file" in request.files:
+        return pd.read_csv(request.files["file"], sep=request.args.get("sep", ","), dtype=str)
+    if request.mimetype == "text/csv":
+        return pd.read_csv(io.StringIO(request.get_data(as_text=True)), sep=request.args.get("sep", ","), dtype=str)
+    data = request.get_json(silent=True)
+    records = data.get("records") if isinstance(data, dict) else data
+    if not isinstance(records, list):
+        raise ValueError("Expected a JSON list of feature records or a CSV upload")
+    # Non-object entries become empty rows and are reported as missing every feature
+    return pd.DataFrame.from_records([r if isinstance(r, dict) else {} for r in records])
+
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    try:
+        with metrics.stage("parse"):
+            frame = read_batch_frame()
+    except Exception as e:
+        metrics.error("bad_batch")
+        return jsonify({"error": f"Could not read batch: {e}"}), 400
+    if len(frame) > MAX_BATCH_ROWS:
+        return jsonify({"error": f"Batch too large: {len(frame)} rows (max {MAX_BATCH_ROWS})"}), 413
+
+    try:
+        bundle = model_loader.get()
+        features = bundle.features
+
+        # Validate every row against the feature schema at once
+        with metrics.stage("convert"):
+            raw = frame.reindex(columns=features)
+            values = raw.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+            missing = raw.isna().to_numpy()
+            # to_numeric accepts "nan" and "inf"; anything non-finite is as unusable as text
+            invalid = ~np.isfinite(values) & ~missing
+            valid = ~(missing | invalid).any(axis=1)
+
+        errors = []
+        for i in np.flatnonzero(~valid):
+            problems = []
+            if missing[i].any():
+                problems.append("Missing features: " + ", ".join(np.asarray(features)[missing[i]]))
+            if invalid[i].any():
+                problems.append("Invalid values for: " + ", ".join(np.asarray(features)[invalid[i]]))
+            errors.append({"row": int(i), "error": "; ".join(problems)})
+
+        results = []
+        rows = np.flatnonzero(valid)
+        if len(rows):
+            with metrics.stage("score"):
+                X = values[rows]
+                labels, proba, levels = score_matrix(bundle.kernel, X)
+            drift_monitor.observe(bundle, X)
+            for i, label, p, level in zip(rows.tolist(), labels.tolist(), proba.tolist(), levels.tolist()):
+                _, risk_level, message = RISK_LEVELS[level]
+                results.append({
+                    "row": i,
+                    "prediction": label,
+                    "probability": round(p, 4),
+                    "risk_level": risk_level,
+                    "message": message
+                })
+
+        return jsonify({"count": len(frame), "model_version": bundle.version, "results": results, "errors": errors})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/admin/micro-batch")
+@admin_required
+def micro_batch_stats():
+    return jsonify(micro_batcher.stats())
+
 @app.route("/result")
 def result_page():
     # Example data (in real scenario, redirect after prediction or store in session)
@@ -0,0 +1,94 @@
+"""Memoized predictions keyed on the canonical feature vector and the model version."""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionCache:
+    """Maps (model version, feature vector) to the probability the model gave for it.
+
+    Feature vectors are canonicalized to float64 bytes in schema order, so "50", 50 and 50.0 share
+    an entry. Entries expire after `ttl` seconds and the least recently used entry is evicted once
+    `max_entries` are held (about 0.5 KB each for 58 features). Seeing a new model version drops
+    every entry of the old one, so a model swap never serves a stale score. Each worker process
+    holds its own entries; given `workers` (a workerState.WorkerState), worker_stats() sums them.
+    """
+
+    def __init__(self, max_entries=20000, ttl=3600.0, workers=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, probability)
+        self._version = None
+        self._lock = threading.Lock()
+        self._stats = dict(hits=0, misses=0, evictions=0, expirations=0, version_flushes=0)
+        self._workers = workers
+        if workers is not None:
+            workers.register('prediction_cache', self.stats)
+
+    @staticmethod
+    def key(row):
+        # + 0.0 folds -0.0 into 0.0 so both hash the same
+        return (np.asarray(row, dtype=np.float64).ravel() + 0.0).tobytes()
+
+    def get(self, version, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key) if version == self._version else None
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                    self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1]
+
+    def set(self, version, key, probability):
+        with self._lock:
+            if version != self._version:
+                if self._entries:
+                    self._stats['version_flushes'] += 1
+                self._entries.clear()
+                self._version = version
+            self._entries[key] = (time.monotonic() + self.ttl, probability)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def probability(self, version, row, compute):
+        """Cached probability for `row` under model `version`, calling compute(row) on a miss."""
+        key = self.key(row)
+        probability = self.get(version, key)
+        if probability is None:
+            probability = float(compute(row))
+            self.set(version, key, probability)
+        return probability
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries), max_entries=self.max_entries, ttl=self.ttl,
+                         version=self._version)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def worker_stats(self):
+        """stats() summed over the running worker processes, with each worker's own under 'workers'."""
+        workers = self._workers.gather('prediction_cache', live=True) if self._workers else {}
+        if not workers:
+            return self.stats()
+        total = dict(self.stats())
+        for key in ('hits', 'misses', 'evictions', 'expirations', 'version_flushes', 'size'):
+            total[key] = sum(stats[key] for stats in workers.values())
+        lookups = total['hits'] + total['misses']
+        total['hit_rate'] = total['hits'] / lookups if lookups else 0.0
+        total['workers'] = {str(pid): stats for pid, stats in sorted(workers.items())}
+        return total
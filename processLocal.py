@@ -0,0 +1,48 @@
+"""Background threads and pools started on first use, once in every process.
+
+serve.py forks its workers from a master that has imported the app, so each worker inherits the
+app's objects but none of their threads. ProcessLocal is reset in the child right after a fork
+(os.register_at_fork), so checking it on a hot path is an attribute read rather than an
+os.getpid() call per request.
+"""
+import os
+import threading
+import weakref
+
+
+def after_fork_in_child(method):
+    """Call the bound `method` in every child forked from now on, without keeping its object alive."""
+    ref = weakref.WeakMethod(method)
+
+    def call():
+        method = ref()
+        if method is not None:
+            method()
+
+    os.register_at_fork(after_in_child=call)
+
+
+class ProcessLocal:
+    """The result of start(), called on the first get() in each process."""
+
+    def __init__(self, start):
+        self._start = start
+        self._reset()
+        after_fork_in_child(self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._value = None
+        self._started = False
+
+    def get(self):
+        if not self._started:
+            with self._lock:
+                if not self._started:
+                    self._value = self._start()
+                    self._started = True
+        return self._value
+
+    def current(self):
+        """What get() returned in this process, or None if nothing was started here yet."""
+        return self._value
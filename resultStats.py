@@ -0,0 +1,224 @@
+"""Cohort statistics over results, maintained incrementally so reading them never scans results.
+
+result_stats holds one row per statistic: results and summed percentage per risk level, plus the
+number of users tested and the number who took the test more than once. result_daily_stats
+holds the result count and summed percentage per day. result_users counts results per user; its
+row lock is what keeps users_tested and users_retaking exact when one user submits twice at once. The checklist route updates both in the
+same transaction as its INSERT (record_result); backfill() rebuilds them from history.
+
+    python resultStats.py backfill --batch-size 10000
+    python resultStats.py show --days 30
+"""
+from datetime import date, timedelta
+
+RISK_LEVELS = ('Low', 'Medium', 'High')
+
+CREATE_STATS_TABLES = [
+    """
+        CREATE TABLE IF NOT EXISTS result_stats (
+            stat VARCHAR(64) PRIMARY KEY,
+            results BIGINT NOT NULL DEFAULT 0,
+            percentage_sum DECIMAL(20,2) NOT NULL DEFAULT 0
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS result_daily_stats (
+            day DATE PRIMARY KEY,
+            results INT NOT NULL DEFAULT 0,
+            percentage_sum DECIMAL(16,2) NOT NULL DEFAULT 0
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS result_users (
+            user_id INT PRIMARY KEY,
+            results INT NOT NULL DEFAULT 0
+        )
+    """
+]
+
+UPSERT_STATS_SQL = """
+    INSERT INTO result_stats (stat, results, percentage_sum) VALUES {values}
+    ON DUPLICATE KEY UPDATE results = results + VALUES(results),
+                            percentage_sum = percentage_sum + VALUES(percentage_sum)
+"""
+UPSERT_DAILY_SQL = """
+    INSERT INTO result_daily_stats (day, results, percentage_sum) VALUES {values}
+    ON DUPLICATE KEY UPDATE results = results + VALUES(results),
+                            percentage_sum = percentage_sum + VALUES(percentage_sum)
+"""
+
+UPSERT_USERS_SQL = """
+    INSERT INTO result_users (user_id, results) VALUES {values}
+    ON DUPLICATE KEY UPDATE results = results + VALUES(results)
+"""
+
+MAX_SUMMARY_DAYS = 366
+
+
+def _upsert(cursor, sql, rows):
+    # rows: [(key, results, percentage_sum), ...] (or (user_id, results)) added onto the existing counters
+    if rows:
+        placeholders = '(' + ', '.join(['%s'] * len(rows[0])) + ')'
+        cursor.execute(sql.format(values=', '.join([placeholders] * len(rows))),
+                       [value for row in rows for value in row])
+
+
+def record_result(cursor, user_id, percentage, risk_level):
+    """Count a result that is about to be inserted; call it in the same transaction, before the INSERT."""
+    # The upsert locks the user's counter row until commit, so concurrent results of one user take
+    # turns and each reads its own count: 1 -> newly tested, 2 -> first retake
+    _upsert(cursor, UPSERT_USERS_SQL, [(user_id, 1)])
+    cursor.execute("SELECT results FROM result_users WHERE user_id = %s", (user_id,))
+    count = _row(cursor.fetchone(), 'results')[0]
+    stats = [(f'risk_level:{risk_level}', 1, percentage)]
+    if count == 1:
+        stats.append(('users_tested', 1, 0))
+    elif count == 2:
+        stats.append(('users_retaking', 1, 0))
+    _upsert(cursor, UPSERT_STATS_SQL, stats)
+    # Same calendar as created_at's CURRENT_TIMESTAMP default
+    cursor.execute(UPSERT_DAILY_SQL.format(values='(CURRENT_DATE, 1, %s)'), (percentage,))
+
+
+def _row(row, *columns):
+    # DictCursor rows (app connections) and plain tuples read the same
+    return tuple(row[c] for c in columns) if isinstance(row, dict) else tuple(row)
+
+
+def read_summary(cursor, days=30):
+    """Aggregates from the summary tables: a handful of primary-key rows plus `days` daily rows."""
+    days = max(1, min(int(days), MAX_SUMMARY_DAYS))
+    cursor.execute("SELECT stat, results, percentage_sum FROM result_stats")
+    stats = {}
+    for row in cursor.fetchall():
+        stat, results, percentage_sum = _row(row, 'stat', 'results', 'percentage_sum')
+        stats[stat] = (int(results), float(percentage_sum))
+
+    risk_levels = {}
+    for level in RISK_LEVELS:
+        results, percentage_sum = stats.get(f'risk_level:{level}', (0, 0.0))
+        risk_levels[level] = {
+            'results': results,
+            'mean_percentage': round(percentage_sum / results, 2) if results else None
+        }
+    total = sum(level['results'] for level in risk_levels.values())
+    tested = stats.get('users_tested', (0, 0.0))[0]
+    retaking = stats.get('users_retaking', (0, 0.0))[0]
+
+    cursor.execute("""
+        SELECT day, results, percentage_sum FROM result_daily_stats
+        WHERE day >= %s
+        ORDER BY day
+    """, (date.today() - timedelta(days=days - 1),))
+    daily = []
+    for row in cursor.fetchall():
+        day, results, percentage_sum = _row(row, 'day', 'results', 'percentage_sum')
+        daily.append({
+            'day': str(day),
+            'results': int(results),
+            'mean_percentage': round(float(percentage_sum) / results, 2) if results else None
+        })
+
+    return {
+        'results': total,
+        'risk_levels': risk_levels,
+        'users_tested': tested,
+        'users_retaking': retaking,
+        'retake_rate': round(retaking / tested, 4) if tested else 0.0,
+        'daily': daily
+    }
+
+
+def backfill(conn, batch_size=10000, log=print):
+    """Rebuild the summary tables from results, committing once per batch of `batch_size` rows.
+
+    Results inserted after the rebuild starts are counted by the live path; run it while the
+    checklist is quiet so rows committed mid-rebuild are not counted twice.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM result_stats")
+        cursor.execute("DELETE FROM result_daily_stats")
+        cursor.execute("DELETE FROM result_users")
+        conn.commit()
+        cursor.execute("SELECT MAX(id) AS max_id FROM results")
+        max_id = _row(cursor.fetchone(), 'max_id')[0] or 0
+
+        # Risk levels and days, in primary-key ranges
+        last_id, scanned = 0, 0
+        while last_id < max_id:
+            cursor.execute("""
+                SELECT id, percentage, risk_level, DATE(created_at) AS day FROM results
+                WHERE id > %s AND id <= %s
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, max_id, batch_size))
+            rows = [_row(r, 'id', 'percentage', 'risk_level', 'day') for r in cursor.fetchall()]
+            if not rows:
+                break
+            by_level, by_day = {}, {}
+            for _, percentage, risk_level, day in rows:
+                for key, bucket in ((f'risk_level:{risk_level}', by_level), (str(day), by_day)):
+                    count, total = bucket.get(key, (0, 0.0))
+                    bucket[key] = (count + 1, total + float(percentage))
+            _upsert(cursor, UPSERT_STATS_SQL, [(k, c, round(t, 2)) for k, (c, t) in by_level.items()])
+            _upsert(cursor, UPSERT_DAILY_SQL, [(k, c, round(t, 2)) for k, (c, t) in by_day.items()])
+            conn.commit()
+            last_id = rows[-1][0]
+            scanned += len(rows)
+            log(f"📦 {scanned} results counted (up to id {last_id})")
+
+        # Tested/retaking users, in user_id ranges over the (user_id, created_at) index
+        last_user, tested, retaking = -1, 0, 0
+        while True:
+            cursor.execute("""
+                SELECT user_id, COUNT(*) AS n FROM results
+                WHERE user_id > %s AND id <= %s
+                GROUP BY user_id
+                ORDER BY user_id
+                LIMIT %s
+            """, (last_user, max_id, batch_size))
+            rows = [_row(r, 'user_id', 'n') for r in cursor.fetchall()]
+            if not rows:
+                break
+            _upsert(cursor, UPSERT_USERS_SQL, rows)
+            conn.commit()
+            tested += len(rows)
+            retaking += sum(1 for _, n in rows if n >= 2)
+            last_user = rows[-1][0]
+        _upsert(cursor, UPSERT_STATS_SQL, [('users_tested', tested, 0), ('users_retaking', retaking, 0)])
+        conn.commit()
+        log(f"✅ Summary rebuilt: {scanned} results, {tested} users, {retaking} retaking")
+        return {'results': scanned, 'users_tested': tested, 'users_retaking': retaking}
+    finally:
+        cursor.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Rebuild or print the results summary tables")
+    sub = parser.add_subparsers(dest='command', required=True)
+    fill = sub.add_parser('backfill', help="rebuild the summary tables from the results table")
+    fill.add_argument('--batch-size', type=int, default=10000)
+    show = sub.add_parser('show', help="print the aggregates")
+    show.add_argument('--days', type=int, default=30)
+    args = parser.parse_args()
+
+    from app import connect_db
+
+    conn = connect_db()
+    try:
+        if args.command == 'backfill':
+            cursor = conn.cursor()
+            for statement in CREATE_STATS_TABLES:
+                cursor.execute(statement)
+            cursor.close()
+            backfill(conn, args.batch_size)
+        else:
+            cursor = conn.cursor()
+            print(json.dumps(read_summary(cursor, args.days), indent=2))
+            cursor.close()
+    finally:
+        conn.close()
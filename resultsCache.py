@@ -0,0 +1,81 @@
+"""Per-user cache of the dashboard's recent results, with TTL expiry and LRU eviction."""
+import threading
+import time
+from collections import OrderedDict
+
+
+class RecentResultsCache:
+    """Maps user_id to that user's most recent result rows.
+
+    Entries expire after `ttl` seconds, and once `max_users` users are cached the least recently
+    used entry is evicted. Each worker process holds its own entries, but invalidation goes through
+    a per-user generation counter in `store` (the session store, shared by every worker on the
+    host): invalidate() bumps it, and get() drops an entry cached under an older generation. A
+    reader takes generation() before querying and passes it to set(), so rows read before an
+    invalidation are never cached after it.
+    """
+
+    def __init__(self, store, max_users=10000, ttl=60.0):
+        self.store = store
+        self.max_users = max_users
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (expires_at, generation, rows)
+        self._lock = threading.Lock()
+        self._stats = dict(hits=0, misses=0, evictions=0, invalidations=0, stale=0, skipped_sets=0)
+
+    @staticmethod
+    def _key(user_id):
+        return f'recent_results:{user_id}'
+
+    def generation(self, user_id):
+        """Current shared generation of `user_id`'s results; pass it to set() after querying."""
+        return self.store.get_generation(self._key(user_id))
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[user_id]
+                self._stats['misses'] += 1
+                return None
+        # Shared read outside the lock; another worker may have invalidated since this was cached
+        if self.generation(user_id) != entry[1]:
+            with self._lock:
+                if self._entries.get(user_id) is entry:
+                    del self._entries[user_id]
+                self._stats['stale'] += 1
+                self._stats['misses'] += 1
+            return None
+        with self._lock:
+            if user_id in self._entries:
+                self._entries.move_to_end(user_id)
+            self._stats['hits'] += 1
+        return entry[2]
+
+    def set(self, user_id, rows, generation):
+        """Caches `rows`, read under `generation`, unless the user's results changed since."""
+        if self.generation(user_id) != generation:
+            with self._lock:
+                self._stats['skipped_sets'] += 1
+            return
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, generation, tuple(rows))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, user_id):
+        self.store.bump_generation(self._key(user_id))
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries), max_users=self.max_users, ttl=self.ttl)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,141 @@
+"""Streaming export of the results table as CSV or NDJSON.
+
+Rows are read through pymysql's unbuffered SSCursor and formatted one batch at a time, so an
+export of any size runs in constant memory and the first bytes go out as soon as MySQL starts
+returning rows. Used by /admin/results/export in app.py and as a CLI:
+
+    python resultsExport.py --format ndjson --since 2025-01-01 -o results.ndjson
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+EXPORT_COLUMNS = ['id', 'user_id', 'score', 'percentage', 'risk_level', 'message', 'model_version',
+                  'created_at', 'responses']
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+FETCH_ROWS = 1000
+
+
+def build_query(since=None, until=None, user_id=None):
+    where, params = [], []
+    if since:
+        where.append('created_at >= %s')
+        params.append(since)
+    if until:
+        where.append('created_at < %s')
+        params.append(until)
+    if user_id is not None:
+        where.append('user_id = %s')
+        params.append(user_id)
+    sql = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM results"
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    return sql + ' ORDER BY id', params
+
+
+def iter_results(conn, since=None, until=None, user_id=None, fetch_rows=FETCH_ROWS):
+    """Yield result rows as tuples in EXPORT_COLUMNS order, streamed from the server.
+
+    `conn` must be a dedicated connection: it can't run other queries until the stream is
+    exhausted or the connection is closed.
+    """
+    import pymysql
+
+    sql, params = build_query(since, until, user_id)
+    cursor = conn.cursor(pymysql.cursors.SSCursor)
+    try:
+        # A slow client must not make the server give up on the open result set
+        cursor.execute("SET SESSION net_write_timeout = 600")
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(fetch_rows)
+            if not rows:
+                return
+            yield from rows
+    finally:
+        cursor.close()
+
+
+def _scalar(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _responses(value):
+    # JSON column text -> object; anything unparseable is passed through as the raw string
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode('utf-8')
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def to_ndjson(rows):
+    for row in rows:
+        record = {column: _scalar(value) for column, value in zip(EXPORT_COLUMNS, row)}
+        record['responses'] = _responses(record['responses'])
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def to_csv(rows, batch_rows=FETCH_ROWS):
+    # The responses column stays a JSON string; yields one chunk per `batch_rows` rows
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    pending = 0
+    for row in rows:
+        writer.writerow([_scalar(value) for value in row])
+        pending += 1
+        if pending >= batch_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def export_results(connect, fmt='csv', since=None, until=None, user_id=None):
+    """Generator of export chunks on a connection of its own, closed when the stream ends or is abandoned."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r} (expected one of {', '.join(FORMATS)})")
+    conn = connect()
+    try:
+        rows = iter_results(conn, since, until, user_id)
+        yield from (to_csv(rows) if fmt == 'csv' else to_ndjson(rows))
+    finally:
+        # Closing mid-stream drops the rest of the result set instead of reading it
+        conn.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Export the results table as CSV or NDJSON")
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('--since', help="only results created at or after this date/time")
+    parser.add_argument('--until', help="only results created before this date/time")
+    parser.add_argument('--user-id', type=int)
+    parser.add_argument('-o', '--output', help="output file (default: stdout)")
+    args = parser.parse_args()
+
+    from app import connect_db
+
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        for chunk in export_results(connect_db, args.format, args.since, args.until, args.user_id):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
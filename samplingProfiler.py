@@ -0,0 +1,234 @@
+"""Opt-in sampling profiler for the Flask apps, safe to switch on under production traffic.
+
+When enabled, one in every `every` requests to the selected routes is profiled. While such a
+request is running, a background thread reads its stack from sys._current_frames() every
+`interval` seconds. Identical stacks are counted in a bounded table, and /admin/profiler/flamegraph
+serves them as collapsed stacks ("route;frame;frame count" lines) for flamegraph.pl or speedscope.
+
+Disabled, the per-request cost is a single attribute check. Enabled, unsampled requests cost
+one counter increment. The sampler thread sleeps unless a profiled request is in flight. Each
+worker process profiles its own requests. Given `workers` (a workerState.WorkerState), the admin
+endpoints configure and reset every worker, and the flamegraph merges the stacks of all of them.
+"""
+import itertools
+import os
+import sys
+import threading
+import time
+
+from flask import Response, g, jsonify, request
+
+from adminAuth import admin_required
+from metrics import current_route
+from processLocal import ProcessLocal
+
+OVERFLOW_FRAME = '[other stacks]'
+
+
+def _frame_label(code):
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f'{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    def __init__(self, enabled=False, routes=(), every=100, interval=0.005, max_stacks=5000, max_depth=64,
+                 workers=None):
+        self.enabled = False
+        self.routes = frozenset()
+        self.every = 1
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.max_depth = max_depth
+        self._stacks = {}       # collapsed stack -> samples
+        self._active = {}       # thread ident -> route of a request being profiled
+        self._counters = {}     # route -> itertools.count, for the 1-in-N choice
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        # Started with the first profiled request in each process (threads don't survive fork)
+        self._thread = ProcessLocal(self._start_sampler)
+        self._stats = dict(profiled_requests=0, samples=0, overflow_samples=0, sampling_seconds=0.0)
+        self.configure(enabled=enabled, routes=routes, every=every)
+        self._workers = workers
+        if workers is not None:
+            workers.register('profiler', self._state)
+            workers.subscribe('profiler.config', lambda settings: self.configure(**settings))
+            workers.subscribe('profiler.reset', lambda value: self._clear())
+
+    def configure(self, enabled=None, routes=None, every=None, interval=None):
+        # Validate everything before applying anything
+        if every is not None and int(every) < 1:
+            raise ValueError('every must be at least 1')
+        if interval is not None and not 0.001 <= float(interval) <= 1.0:
+            raise ValueError('interval must be between 0.001 and 1 second')
+        if routes is not None:
+            self.routes = frozenset(routes)
+        if every is not None:
+            self.every = int(every)
+        if interval is not None:
+            self.interval = float(interval)
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        return self.stats()
+
+    def _start_sampler(self):
+        self._active = {}
+        thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        thread.start()
+        return thread
+
+    def start_request(self):
+        """Called before each request; marks it for sampling if it is the route's Nth."""
+        if not self.enabled:
+            return
+        route = current_route()
+        if self.routes and route not in self.routes:
+            return
+        counter = self._counters.get(route)
+        if counter is None:
+            counter = self._counters.setdefault(route, itertools.count())
+        if next(counter) % self.every:
+            return
+        self._thread.get()
+        g._profiled = True
+        self._active[threading.get_ident()] = route
+        with self._lock:
+            self._stats['profiled_requests'] += 1
+        self._wake.set()
+
+    def end_request(self):
+        if g.pop('_profiled', False):
+            self._active.pop(threading.get_ident(), None)
+
+    def _collapse(self, route, frame):
+        labels = []
+        while frame is not None and len(labels) < self.max_depth:
+            labels.append(_frame_label(frame.f_code))
+            frame = frame.f_back
+        if frame is not None:
+            labels.append('...')  # outermost frames cut at max_depth
+        labels.append(route)
+        return ';'.join(reversed(labels))
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            if not self._active:
+                self._wake.clear()
+                if not self._active:
+                    self._wake.wait()
+            time.sleep(self.interval)
+            active = dict(self._active)
+            if not active:
+                continue
+            started = time.perf_counter()
+            frames = sys._current_frames()
+            stacks = [self._collapse(route, frames[ident]) for ident, route in active.items()
+                      if ident != me and ident in frames]
+            del frames
+            with self._lock:
+                for stack in stacks:
+                    if stack not in self._stacks and len(self._stacks) >= self.max_stacks:
+                        # Table full: keep counting, under the route only
+                        stack = stack.split(';', 1)[0] + ';' + OVERFLOW_FRAME
+                        self._stats['overflow_samples'] += 1
+                    self._stacks[stack] = self._stacks.get(stack, 0) + 1
+                self._stats['samples'] += len(stacks)
+                self._stats['sampling_seconds'] += time.perf_counter() - started
+
+    def _state(self):
+        with self._lock:
+            return {'stacks': dict(self._stacks), 'stats': dict(self._stats)}
+
+    def _gather(self):
+        # Stacks and counters of every worker since the last reset (just this one without `workers`)
+        if self._workers is None:
+            return [self._state()]
+        return list(self._workers.gather('profiler', setting='profiler.reset').values())
+
+    def collapsed(self):
+        # Collapsed-stack text, heaviest stacks first
+        stacks = {}
+        for state in self._gather():
+            for stack, count in state['stacks'].items():
+                stacks[stack] = stacks.get(stack, 0) + count
+        items = sorted(stacks.items(), key=lambda item: -item[1])
+        return ''.join(f'{stack} {count}\n' for stack, count in items)
+
+    def _clear(self):
+        with self._lock:
+            self._stacks = {}
+            for key in self._stats:
+                self._stats[key] = 0.0 if key == 'sampling_seconds' else 0
+
+    def clear(self):
+        if self._workers is not None:
+            self._workers.publish('profiler.reset')
+        else:
+            self._clear()
+
+    def settings(self):
+        return {'enabled': self.enabled, 'routes': sorted(self.routes), 'every': self.every,
+                'interval': self.interval}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, stacks=len(self._stacks))
+        stats.update(self.settings(), max_stacks=self.max_stacks, in_flight=len(self._active))
+        return stats
+
+    def worker_stats(self):
+        """stats() with the sample counters and stack count summed over every worker."""
+        states = self._gather()
+        stats = self.stats()
+        for key in self._stats:
+            stats[key] = sum(state['stats'][key] for state in states)
+        stats['stacks'] = len({stack for state in states for stack in state['stacks']})
+        stats['workers'] = len(states)
+        return stats
+
+    def instrument(self, app):
+        """Hook the request cycle of `app` and serve the /admin/profiler endpoints."""
+
+        @app.before_request
+        def _profile_start():
+            if self.enabled:
+                self.start_request()
+
+        @app.teardown_request
+        def _profile_end(exc):
+            if self.enabled or '_profiled' in g:
+                self.end_request()
+
+        @app.route('/admin/profiler', methods=['GET', 'POST'])
+        @admin_required
+        def profiler_settings():
+            # POST {"enabled": true, "routes": ["/checklist"], "every": 50, "interval": 0.005}
+            if request.method == 'POST':
+                data = request.get_json(silent=True) or {}
+                routes = data.get('routes')
+                if routes is not None and (not isinstance(routes, list)
+                                           or not all(isinstance(r, str) for r in routes)):
+                    return jsonify({'error': 'routes must be a list of route rules'}), 400
+                try:
+                    self.configure(enabled=data.get('enabled'), routes=routes, every=data.get('every'),
+                                   interval=data.get('interval'))
+                except (TypeError, ValueError) as e:
+                    return jsonify({'error': str(e)}), 400
+                if self._workers is not None:
+                    self._workers.publish('profiler.config', self.settings())
+            return jsonify(self.worker_stats())
+
+        @app.route('/admin/profiler/flamegraph')
+        @admin_required
+        def profiler_flamegraph():
+            return Response(self.collapsed(), mimetype='text/plain',
+                            headers={'Content-Disposition': 'attachment; filename=profile.folded'})
+
+        @app.route('/admin/profiler/reset', methods=['POST'])
+        @admin_required
+        def profiler_reset():
+            self.clear()
+            return jsonify(self.worker_stats())
+
+        return app
+
@@ -0,0 +1,312 @@
+"""Pre-fork production server for app.py and predictApp.py.
+
+The master process imports the app, loads and warms the model bundle, closes any database
+connections, then calls gc.freeze() before forking workers. Everything loaded up to that point
+(numpy/sklearn/pandas, the model, scaler and kernel) stays shared copy-on-write across the
+workers instead of being imported and unpickled once per worker. Each worker serves the shared
+listening socket with a fixed pool of threads.
+
+    python serve.py app:app --workers 4 --threads 8 --bind 0.0.0.0:5000
+
+Signals to the master: SIGHUP reloads the bundle in the master and replaces the workers one
+generation at a time (new workers start before old ones drain); SIGTERM/SIGINT drain in-flight
+requests and stop. Workers that die are replaced.
+
+With more than one worker, app.py's sessions go to a SQLite file all workers share: ADHD_SESSION_DB
+if set, else --session-db (run/sessions.sqlite3 under the working directory). Each worker also writes its
+metrics, drift, prediction-cache and profiler state to ADHD_METRICS_DIR (else --metrics-dir), so
+/metrics and the admin endpoints report every worker whichever one answers; the master empties
+that directory when it starts.
+"""
+import argparse
+import gc
+import importlib
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+import workerState
+
+DEFAULT_WORKERS = os.cpu_count() or 2
+DEFAULT_THREADS = 8
+GRACEFUL_TIMEOUT = 30.0
+# Session store shared by the workers when ADHD_SESSION_DB isn't set (relative to the working directory)
+DEFAULT_SESSION_DB = "run/sessions.sqlite3"
+# Per-worker metric and admin-state shards when ADHD_METRICS_DIR isn't set
+DEFAULT_METRICS_DIR = "run/metrics"
+
+
+class _RequestHandler(WSGIRequestHandler):
+    # One request per connection, so an idle keep-alive client never pins a pool thread
+    protocol_version = "HTTP/1.0"
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug WSGI server answering requests on a fixed pool of `threads` threads.
+
+    When every thread is busy the accept loop waits, leaving new connections in the kernel
+    backlog where an idle sibling worker can pick them up.
+    """
+
+    multithread = True
+    multiprocess = True
+
+    def __init__(self, host, port, app, threads=DEFAULT_THREADS, fd=None):
+        super().__init__(host, port, app, handler=_RequestHandler, fd=fd)
+        self._slots = threading.BoundedSemaphore(threads)
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix="http")
+
+    def process_request(self, request, client_address):
+        self._slots.acquire()
+        self._executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def drain(self):
+        # Stop accepting, then wait for the requests already being handled
+        self.shutdown()
+        self._executor.shutdown(wait=True)
+
+
+def load_target(target):
+    """Import "module:attribute" and return (module, WSGI app)."""
+    module_name, _, attr = target.partition(":")
+    module = importlib.import_module(module_name)
+    return module, getattr(module, attr or "app")
+
+
+def warm(module):
+    """Load, validate and exercise the module's model bundle so workers inherit it ready to score."""
+    loader = getattr(module, "model_loader", None)
+    if loader is None:
+        return None
+    # reload() loads and validates (building the kernel) without starting the per-process watcher
+    bundle = loader.reload()
+    bundle.kernel.probability([[0.0] * len(bundle.features)])
+    return bundle
+
+
+def prepare_fork(module):
+    # Pooled connections must not be shared between processes
+    pool = getattr(module, "db_pool", None)
+    if pool is not None:
+        pool.close_all()
+    gc.collect()
+    gc.freeze()
+
+
+def bind_socket(bind, backlog):
+    host, _, port = bind.rpartition(":")
+    host = host.strip("[]") or "0.0.0.0"
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, int(port)))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def finish_worker(module):
+    # os._exit skips atexit, so flush the worker's queued audit events and final metrics here
+    activity_log = getattr(module, "activity_log", None)
+    if activity_log is not None:
+        activity_log.shutdown()
+    metrics = getattr(module, "metrics", None)
+    if metrics is not None:
+        metrics.workers.close()
+
+
+def run_worker(module, wsgi_app, sock, threads):
+    server = PooledWSGIServer(*sock.getsockname()[:2], wsgi_app, threads=threads, fd=sock.fileno())
+
+    def stop(signum, frame):
+        # shutdown() blocks until serve_forever returns, so it can't run in the serving thread
+        threading.Thread(target=server.drain, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    try:
+        server.serve_forever()
+        server._executor.shutdown(wait=True)
+    finally:
+        finish_worker(module)
+    os._exit(0)
+
+
+class Master:
+    def __init__(self, target, bind, workers=DEFAULT_WORKERS, threads=DEFAULT_THREADS, backlog=2048,
+                 graceful_timeout=GRACEFUL_TIMEOUT, init_db=False, session_db=DEFAULT_SESSION_DB,
+                 metrics_dir=DEFAULT_METRICS_DIR):
+        self.target = target
+        self.workers = workers
+        self.threads = threads
+        self.graceful_timeout = graceful_timeout
+        if workers > 1 and not os.environ.get("ADHD_SESSION_DB"):
+            # Per-process memory sessions would log users out whenever another worker answers;
+            # the app picks its session store up from the environment at import
+            session_db = os.path.abspath(session_db)
+            os.makedirs(os.path.dirname(session_db), exist_ok=True)
+            os.environ["ADHD_SESSION_DB"] = session_db
+        if workers > 1 and not os.environ.get("ADHD_METRICS_DIR"):
+            os.environ["ADHD_METRICS_DIR"] = os.path.abspath(metrics_dir)
+        if os.environ.get("ADHD_METRICS_DIR"):
+            # Shards of a previous run would be added to this one's counters
+            workerState.clear(os.environ["ADHD_METRICS_DIR"])
+        self.module, self.app = load_target(target)
+        store = getattr(self.module, "session_store", None)
+        if workers > 1 and store is not None and store.stats().get("backend") == "memory":
+            raise SystemExit(f"❌ {target} keeps sessions in process memory, which {workers} workers can't share; "
+                             "configure a shared session store or run one worker")
+        if store is not None and store.stats().get("backend") == "sqlite":
+            print(f"🔐 Sessions shared through {store.path}")
+        metrics = getattr(self.module, "metrics", None)
+        if metrics is not None and metrics.workers.directory:
+            print(f"📊 Worker metrics merged through {metrics.workers.directory}")
+        if init_db and hasattr(self.module, "init_db"):
+            self.module.init_db()
+        self.sock = bind_socket(bind, backlog)
+        self.children = {}   # pid -> generation
+        self.generation = 0
+        self._signals = []
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(self.module, self.app, self.sock, self.threads)
+            finally:
+                os._exit(1)
+        self.children[pid] = self.generation
+        return pid
+
+    def reap(self):
+        exited = []
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            generation = self.children.pop(pid, None)
+            if generation is not None:
+                exited.append((pid, generation, status))
+        return exited
+
+    def stop_workers(self, pids, timeout):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + timeout
+        while any(pid in self.children for pid in pids) and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.05)
+        for pid in pids:
+            if pid in self.children:
+                print(f"⚠️  Worker {pid} did not drain in {timeout:g}s, killing it")
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+        while any(pid in self.children for pid in pids):
+            self.reap()
+            time.sleep(0.05)
+
+    def restart(self):
+        # New generation first (on the freshly loaded bundle), then drain the old one
+        try:
+            bundle = warm(self.module)
+        except Exception as e:
+            print(f"❌ Restart aborted, bundle rejected: {e}")
+            return
+        prepare_fork(self.module)
+        old = list(self.children)
+        self.generation += 1
+        for _ in range(self.workers):
+            self.spawn()
+        self.stop_workers(old, self.graceful_timeout)
+        print(f"🔄 Workers restarted (generation {self.generation}, model {bundle.version if bundle else 'n/a'})")
+
+    def run(self):
+        try:
+            bundle = warm(self.module)
+        except Exception as e:
+            # Same as the apps themselves: serve, and report the missing model per request
+            print(f"⚠️  Model bundle not loaded before forking: {e}")
+            bundle = None
+        prepare_fork(self.module)
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, lambda signum, frame: self._signals.append(signum))
+        for _ in range(self.workers):
+            self.spawn()
+        host, port = self.sock.getsockname()[:2]
+        print(f"🌐 {self.target} on http://{host}:{port} — {self.workers} workers x {self.threads} threads, "
+              f"model {bundle.version if bundle else 'n/a'}, master pid {os.getpid()}")
+
+        while True:
+            if self._signals:
+                signum = self._signals.pop(0)
+                if signum == signal.SIGHUP:
+                    self.restart()
+                    continue
+                self.stop_workers(list(self.children), self.graceful_timeout)
+                self.sock.close()
+                print("👋 Stopped")
+                return
+            for pid, generation, status in self.reap():
+                if generation == self.generation:
+                    print(f"⚠️  Worker {pid} exited ({status}), starting a replacement")
+                    time.sleep(0.1)  # don't spin if workers die immediately
+                    self.spawn()
+            time.sleep(0.2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-fork server for the ADHD screening apps")
+    parser.add_argument("target", nargs="?", default="app:app", help="module:app to serve (app:app, predictApp:app)")
+    parser.add_argument("-b", "--bind", default="0.0.0.0:5000")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("-t", "--threads", type=int, default=DEFAULT_THREADS, help="request threads per worker")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--graceful-timeout", type=float, default=GRACEFUL_TIMEOUT,
+                        help="seconds a stopping worker may spend finishing requests")
+    parser.add_argument("--init-db", action="store_true", help="create/migrate tables before forking")
+    parser.add_argument("--session-db", default=DEFAULT_SESSION_DB,
+                        help="SQLite session store for the workers when ADHD_SESSION_DB is not set")
+    parser.add_argument("--metrics-dir", default=DEFAULT_METRICS_DIR,
+                        help="directory of per-worker metric shards when ADHD_METRICS_DIR is not set")
+    parser.add_argument("--pidfile", help="write the master pid here (for kill -HUP)")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.getcwd())
+    master = Master(args.target, args.bind, args.workers, args.threads, args.backlog, args.graceful_timeout,
+                    args.init_db, args.session_db, args.metrics_dir)
+    if args.pidfile:
+        with open(args.pidfile, "w") as f:
+            f.write(str(os.getpid()))
+    try:
+        master.run()
+    finally:
+        if args.pidfile and os.path.exists(args.pidfile):
+            os.remove(args.pidfile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""Server-side Flask sessions plus a cache of the logged-in user's record.
+
+The cookie carries only a random, opaque session ID; the session payload lives in a store, either
+in this process (MemorySessionStore) or in a local SQLite file that every worker process on the
+host shares (SQLiteSessionStore). The same store caches user records so pages can render the
+current user without a users-table query, and keeps generation counters that let per-process caches
+notice invalidations made by other workers.
+"""
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from processLocal import after_fork_in_child
+
+# Columns of users that may be cached; never the password hash
+USER_FIELDS = ('id', 'name', 'email', 'age', 'gender', 'phone', 'address', 'is_active', 'created_at', 'updated_at')
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.modified = False
+        self.accessed = False
+        self.rotate = False
+
+    def regenerate(self):
+        # Issue a new ID when privileges change (login) so a pre-login ID can't be fixated
+        self.rotate = True
+        self.modified = True
+
+
+class MemorySessionStore:
+    """Sessions and user records in this process; only for single-process deployments."""
+
+    def __init__(self, max_sessions=100000, max_users=10000):
+        self.max_sessions = max_sessions
+        self.max_users = max_users
+        self._tables = {'sessions': OrderedDict(), 'users': OrderedDict()}  # key -> (expires_at, payload)
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def _get(self, table, key):
+        with self._lock:
+            entry = self._tables[table].get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._tables[table][key]
+                return None
+            self._tables[table].move_to_end(key)
+            return entry[1]
+
+    def _set(self, table, key, payload, ttl, limit):
+        with self._lock:
+            entries = self._tables[table]
+            entries[key] = (time.time() + ttl, payload)
+            entries.move_to_end(key)
+            while len(entries) > limit:
+                entries.popitem(last=False)
+
+    def _delete(self, table, key):
+        with self._lock:
+            self._tables[table].pop(key, None)
+
+    def get(self, sid):
+        return self._get('sessions', sid)
+
+    def set(self, sid, payload, ttl):
+        self._set('sessions', sid, payload, ttl, self.max_sessions)
+
+    def delete(self, sid):
+        self._delete('sessions', sid)
+
+    def get_user(self, user_id):
+        return self._get('users', user_id)
+
+    def set_user(self, user_id, payload, ttl):
+        self._set('users', user_id, payload, ttl, self.max_users)
+
+    def delete_user(self, user_id):
+        self._delete('users', user_id)
+
+    def get_generation(self, key):
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def bump_generation(self, key):
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {'backend': 'memory', 'sessions': len(self._tables['sessions']),
+                    'cached_users': len(self._tables['users'])}
+
+
+class SQLiteSessionStore:
+    """Sessions and user records in a local SQLite file, shared by every worker process on the host."""
+
+    PURGE_EVERY = 1000  # writes between sweeps of expired rows
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        # Connections must not cross a fork; each worker opens its own
+        after_fork_in_child(self._forget_connections)
+        self._writes = 0
+        db = sqlite3.connect(path)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, payload TEXT, expires_at REAL)")
+        db.execute("CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY, payload TEXT, expires_at REAL)")
+        db.execute("CREATE TABLE IF NOT EXISTS generations (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        db.commit()
+        db.close()
+
+    def _forget_connections(self):
+        self._local = threading.local()
+
+    def _db(self):
+        # One connection per thread
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _get(self, table, column, key):
+        row = self._db().execute(f"SELECT payload FROM {table} WHERE {column} = ? AND expires_at > ?",
+                                 (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def _set(self, table, column, key, payload, ttl):
+        db = self._db()
+        db.execute(f"INSERT OR REPLACE INTO {table} ({column}, payload, expires_at) VALUES (?, ?, ?)",
+                   (key, payload, time.time() + ttl))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            for name in ('sessions', 'users'):
+                db.execute(f"DELETE FROM {name} WHERE expires_at <= ?", (time.time(),))
+
+    def get(self, sid):
+        return self._get('sessions', 'sid', sid)
+
+    def set(self, sid, payload, ttl):
+        self._set('sessions', 'sid', sid, payload, ttl)
+
+    def delete(self, sid):
+        self._db().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def get_user(self, user_id):
+        return self._get('users', 'user_id', user_id)
+
+    def set_user(self, user_id, payload, ttl):
+        self._set('users', 'user_id', user_id, payload, ttl)
+
+    def delete_user(self, user_id):
+        self._db().execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+
+    def get_generation(self, key):
+        row = self._db().execute("SELECT value FROM generations WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def bump_generation(self, key):
+        self._db().execute("INSERT INTO generations (key, value) VALUES (?, 1) "
+                           "ON CONFLICT(key) DO UPDATE SET value = value + 1", (key,))
+
+    def stats(self):
+        db = self._db()
+        now = time.time()
+        return {
+            'backend': 'sqlite',
+            'path': self.path,
+            'sessions': db.execute("SELECT COUNT(*) FROM sessions WHERE expires_at > ?", (now,)).fetchone()[0],
+            'cached_users': db.execute("SELECT COUNT(*) FROM users WHERE expires_at > ?", (now,)).fetchone()[0]
+        }
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Keeps the session payload in `store`; the cookie holds only the session ID.
+
+    The payload is written back only when the session changed, and an emptied session (logout)
+    is deleted from the store together with its cookie. Sessions live for
+    app.permanent_session_lifetime after their last change.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            payload = self.store.get(sid)
+            if payload is not None:
+                return ServerSession(self.serializer.loads(payload), sid=sid)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.sid is not None and session.modified:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+        if not self.should_set_cookie(app, session):
+            return
+
+        if session.rotate and session.sid is not None:
+            self.store.delete(session.sid)
+            session.sid = None
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        self.store.set(session.sid, self.serializer.dumps(dict(session)),
+                       app.permanent_session_lifetime.total_seconds())
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+
+
+class UserCache:
+    """User records (without the password hash) cached in the session store for `ttl` seconds.
+
+    Anything that updates a users row calls invalidate(); the TTL bounds staleness for updates
+    made outside the app.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, ttl=300.0):
+        self.store = store
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = dict(hits=0, misses=0, invalidations=0)
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def get(self, user_id, load=None):
+        """Cached record for `user_id`; on a miss, load(user_id) fetches it and it is cached."""
+        payload = self.store.get_user(user_id)
+        if payload is not None:
+            self._count('hits')
+            return self.serializer.loads(payload)
+        self._count('misses')
+        record = load(user_id) if load else None
+        if record:
+            record = self.set(record)
+        return record
+
+    def set(self, record):
+        record = {field: record[field] for field in USER_FIELDS if field in record}
+        self.store.set_user(record['id'], self.serializer.dumps(record), self.ttl)
+        return record
+
+    def invalidate(self, user_id):
+        self.store.delete_user(user_id)
+        self._count('invalidations')
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, ttl=self.ttl)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
@@ -1,42 +1,59 @@
 # streamlit_app.py
 import streamlit as st
 import os
-import pickle
-import joblib
 import numpy as np
 import pandas as pd
 import importlib
+from modelBundle import DEFAULT_BUNDLE_PATH, load_bundle
 
 st.set_page_config(page_title="ADHD Screening", layout="centered")
 
 # --- Adjust filenames if your files have different names ---
-MODEL_PATH = "lr_model.pkl"
-SCALER_PATH = "scaler.pkl"
-FEATURES_PATH = "features.pkl"
+MODEL_PATH = DEFAULT_BUNDLE_PATH  # falls back to lr_model.pkl / scaler.pkl / features.pkl
 SAMPLE_CSV = "adhdTest.csv"   # optional sample CSV
+SCORE_CHUNK_ROWS = 2000       # rows scored per vectorized call in upload mode
+MAX_CHOICES = 30              # categorical features with more distinct values get a text box
 
-# --- Helpers to load artifacts ---
-def try_joblib_or_pickle(path):
-    if not os.path.exists(path):
-        return None
-    # try joblib first
-    try:
-        return joblib.load(path)
-    except Exception:
-        pass
-    # fallback to pickle
-    try:
-        with open(path, "rb") as f:
-            return pickle.load(f)
-    except Exception:
-        return None
+def read_table(source, sep=None):
+    # CPT-II exports are semicolon-delimited with a UTF-8 BOM; sep=None sniffs the delimiter
+    return pd.read_csv(source, sep=sep, engine="python" if sep is None else "c", encoding="utf-8-sig")
 
-@st.cache_data
+def build_feature_schema(features, sample_df):
+    """Per-feature input widget settings and category codes, computed once from the sample data."""
+    schema = {}
+    for feat in features:
+        if sample_df is None or feat not in sample_df.columns:
+            schema[feat] = {"kind": "unknown"}
+            continue
+        ser = sample_df[feat].dropna()
+        if pd.api.types.is_numeric_dtype(ser):
+            vmin, vmax = (float(ser.min()), float(ser.max())) if len(ser) else (0.0, 0.0)
+            schema[feat] = {
+                "kind": "numeric",
+                "min": vmin,
+                "max": vmax,
+                "default": float(ser.median()) if len(ser) else 0.0,
+                "step": max((vmax - vmin) / 100.0, 0.01),
+            }
+        else:
+            uniques = ser.unique().tolist()
+            schema[feat] = {
+                "kind": "categorical" if 1 <= len(uniques) <= MAX_CHOICES else "text",
+                "options": uniques,
+                # category -> code, the position in `options` (what uniques.index(val) used to return)
+                "codes": {val: float(code) for code, val in enumerate(uniques)},
+            }
+    return schema
+
+# --- Load artifacts through the shared model bundle loader ---
+@st.cache_resource
 def load_artifacts():
-    model = try_joblib_or_pickle(MODEL_PATH)
-    scaler = try_joblib_or_pickle(SCALER_PATH)
-    features = try_joblib_or_pickle(FEATURES_PATH)
-    sample_df = pd.read_csv(SAMPLE_CSV) if os.path.exists(SAMPLE_CSV) else None
+    try:
+        bundle = load_bundle(MODEL_PATH)
+        model, scaler, features = bundle.model, bundle.scaler, bundle.features
+    except Exception:
+        bundle, model, scaler, features = None, None, None, None
+    sample_df = read_table(SAMPLE_CSV) if os.path.exists(SAMPLE_CSV) else None
     # if features not provided, infer from sample csv
     if features is None and sample_df is not None:
         features = list(sample_df.columns)
@@ -44,15 +61,59 @@ def load_artifacts():
     if features is not None:
         labels = {"label","target","diagnosis","ADHD","Outcome","Result"}
         features = [f for f in features if f not in labels]
-    return model, scaler, features, sample_df
+    schema = build_feature_schema(features, sample_df) if features is not None else {}
+    return bundle, model, scaler, features, sample_df, schema
+
+def encode_value(feat, val):
+    # Numeric strings become floats; categories map through the schema's code dict (unknown -> 0)
+    if isinstance(val, str):
+        try:
+            return float(val)
+        except ValueError:
+            return schema[feat].get("codes", {}).get(val, 0.0)
+    return val
 
-model, scaler, features, sample_df = load_artifacts()
+def encode_frame(df):
+    """(n, len(features)) float matrix for an uploaded frame, plus a per-row mask of unusable rows."""
+    X = np.empty((len(df), len(features)), dtype=float)
+    for j, feat in enumerate(features):
+        col = df[feat] if feat in df.columns else pd.Series(np.nan, index=df.index)
+        values = pd.to_numeric(col, errors="coerce")
+        codes = schema[feat].get("codes")
+        if codes:
+            # Category labels that didn't parse as numbers take their code
+            values = values.fillna(col.map(codes))
+        X[:, j] = values.to_numpy(dtype=float)
+    return X, ~np.isfinite(X).all(axis=1)
+
+def score_upload(df, kernel, progress):
+    """Score every row of `df` in vectorized chunks; returns a copy with prediction columns added."""
+    proba = np.full(len(df), np.nan)
+    labels = np.full(len(df), np.nan)
+    for start in range(0, len(df), SCORE_CHUNK_ROWS):
+        chunk = df.iloc[start:start + SCORE_CHUNK_ROWS]
+        X, bad = encode_frame(chunk)
+        ok = np.flatnonzero(~bad)
+        if len(ok):
+            p = kernel.probability(X[ok])
+            proba[start + ok] = p
+            # Same rule as predictApp.label_probabilities; kernel.predict is the raw model output
+            labels[start + ok] = p >= 0.5
+        done = min(start + SCORE_CHUNK_ROWS, len(df))
+        progress.progress(done / len(df), text=f"Scored {done} of {len(df)} rows")
+    scored = df.copy()
+    scored["ADHD Prediction"] = labels
+    scored["ADHD Probability"] = np.round(proba, 4)
+    scored["Scoring Error"] = np.where(np.isnan(proba), "missing or invalid feature values", "")
+    return scored
+
+bundle, model, scaler, features, sample_df, schema = load_artifacts()
 
 st.title("ADHD Screening — Demo")
 st.write("The UI will try to build inputs from `features.pkl` or `adhdTest.csv`. If you have `predictApp.prepare_input()` implemented, the app will use it.")
 
 if model is None:
-    st.error(f"Model not found at `{MODEL_PATH}`. Put your model file in the same folder as this script.")
+    st.error(f"Model not found at `{MODEL_PATH}` or `lr_model.pkl`. Put your model file in the same folder as this script.")
     st.stop()
 
 # Try to import predictApp (optional)
@@ -66,27 +127,49 @@ if features is None:
     st.warning("No `features.pkl` or sample CSV found. Edit streamlit_app.py to add the expected feature names.")
     st.stop()
 
+mode = st.radio("Mode", ["Single subject", "Score a CSV file"], horizontal=True)
+
+if mode == "Score a CSV file":
+    if bundle is None:
+        st.error("Bulk scoring needs the model bundle (or the legacy .pkl files).")
+        st.stop()
+    uploaded = st.file_uploader("CSV with one subject per row and the model's feature columns", type=["csv"])
+    sep = st.selectbox("Delimiter", [";", ",", "\t"], format_func=lambda s: {"\t": "tab"}.get(s, s))
+    if uploaded is not None:
+        try:
+            df = read_table(uploaded, sep=sep)
+        except Exception as e:
+            st.error(f"Could not read the CSV: {e}")
+            st.stop()
+        missing = [f for f in features if f not in df.columns]
+        if missing:
+            st.error(f"Missing feature columns: {', '.join(missing)}")
+            st.stop()
+        scored = score_upload(df, bundle.kernel, st.progress(0.0, text="Scoring"))
+        failed = int((scored["Scoring Error"] != "").sum())
+        st.success(f"Scored {len(scored) - failed} of {len(scored)} rows" + (f" ({failed} skipped)" if failed else ""))
+        st.dataframe(scored[[c for c in ("ID",) if c in scored.columns] +
+                            ["ADHD Prediction", "ADHD Probability", "Scoring Error"]].head(100))
+        st.download_button("Download scored CSV", scored.to_csv(index=False, sep=sep).encode("utf-8"),
+                           file_name=os.path.splitext(uploaded.name)[0] + "_scored.csv", mime="text/csv")
+    st.stop()
+
 # Build input form
 with st.form("input_form"):
     st.info("Fill the inputs — they are created from features list.")
     user_inputs = {}
-    # Use sample_df to infer numeric vs categorical when available
+    # Widget ranges, defaults and choices come from the schema precomputed in load_artifacts
     for feat in features:
-        if sample_df is not None and feat in sample_df.columns:
-            ser = sample_df[feat].dropna()
-            if pd.api.types.is_numeric_dtype(ser):
-                vmin, vmax = float(ser.min()), float(ser.max())
-                default = float(ser.median())
-                step = max((vmax - vmin) / 100.0, 0.01)
-                user_inputs[feat] = st.number_input(feat, min_value=vmin, max_value=vmax, value=default, step=step, format="%.4f")
-            else:
-                uniques = ser.unique().tolist()
-                if 1 <= len(uniques) <= 30:
-                    choice = st.selectbox(feat, options=uniques)
-                    # store raw choice (we will attempt to encode later)
-                    user_inputs[feat] = choice
-                else:
-                    user_inputs[feat] = st.text_input(feat, value=str(uniques[0]) if len(uniques)>0 else "")
+        spec = schema[feat]
+        if spec["kind"] == "numeric":
+            user_inputs[feat] = st.number_input(feat, min_value=spec["min"], max_value=spec["max"],
+                                                value=spec["default"], step=spec["step"], format="%.4f")
+        elif spec["kind"] == "categorical":
+            # store raw choice (we will attempt to encode later)
+            user_inputs[feat] = st.selectbox(feat, options=spec["options"])
+        elif spec["kind"] == "text":
+            uniques = spec["options"]
+            user_inputs[feat] = st.text_input(feat, value=str(uniques[0]) if len(uniques)>0 else "")
         else:
             # fallback numeric input
             user_inputs[feat] = st.number_input(feat, value=0.0, step=0.1, format="%.4f")
@@ -104,25 +187,7 @@ if submitted:
     else:
         # Fallback: simple numeric conversion in feature order
         try:
-            row = []
-            for feat in features:
-                val = user_inputs[feat]
-                # if val is string but looks numeric, convert
-                if isinstance(val, str):
-                    try:
-                        val = float(val)
-                    except Exception:
-                        # if categorical string, try mapping from sample_df if present
-                        if sample_df is not None and feat in sample_df.columns:
-                            uniques = sample_df[feat].dropna().unique().tolist()
-                            if val in uniques:
-                                val = float(uniques.index(val))
-                            else:
-                                # unknown category -> 0
-                                val = 0.0
-                        else:
-                            val = 0.0
-                row.append(val)
+            row = [encode_value(feat, user_inputs[feat]) for feat in features]
             X = np.array([row], dtype=float)
         except Exception as e:
             st.error(f"Failed to build input array: {e}")
@@ -1,50 +1,237 @@
+"""Train, compare and bundle ADHD screening models from a CPT-II export.
+
+The cleaned feature matrix is cached under --cache-dir keyed by the SHA-256 of the source file
+(plus the feature list and label settings), so re-running a search on the same export skips the
+CSV parse. Logistic regression and random forest grids are cross-validated in parallel with
+fixed seeds; every candidate's accuracy and measured scoring latency go into a JSON report and
+the winner is written as the model bundle the apps load.
+
+    python trainModel.py adhdTest.csv -o model_bundle.joblib
+    python trainModel.py adhdTest.csv -o cpt_bundle.joblib --features raw_features.pkl --from-trials
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import joblib
+from joblib import Parallel, delayed
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import classification_report
-import joblib
-import os
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, classification_report, roc_auc_score
+from sklearn.model_selection import GridSearchCV, StratifiedKFold, train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from cptFeatures import RAW_FEATURES, extract_features, to_trial_array, trial_columns
+from driftMonitor import build_reference, reference_path, save_reference
+from fusedModel import build_scorer
+from modelBundle import DEFAULT_BUNDLE_PATH, LEGACY_FEATURES_PATH, file_sha256, save_bundle
+
+LABEL = "Adhd Confidence Index"
+# A confidence index at or above this counts as an ADHD-positive profile
+DEFAULT_THRESHOLD = 50.0
+DEFAULT_CACHE_DIR = ".cache/train"
+
+SEARCH_SPACES = {
+    "logistic_regression": (
+        lambda seed: LogisticRegression(max_iter=5000, random_state=seed),
+        {"model__C": [0.01, 0.1, 1.0, 10.0], "model__class_weight": [None, "balanced"]},
+    ),
+    "random_forest": (
+        lambda seed: RandomForestClassifier(random_state=seed, n_jobs=1),
+        {"model__n_estimators": [100, 300], "model__max_depth": [None, 4, 8], "model__min_samples_leaf": [1, 3]},
+    ),
+}
+
+
+def load_feature_matrix(file_path, features, threshold=DEFAULT_THRESHOLD, cache_dir=DEFAULT_CACHE_DIR,
+                        chunksize=50000, from_trials=False):
+    """Return (X, y, source_sha256) for `features`, reading the cached matrix when the source is unchanged.
+
+    With `from_trials`, features among cptFeatures.RAW_FEATURES are extracted from the trial
+    columns (as live CPT scoring computes them) instead of read from the export's own columns.
+    """
+    source_sha256 = file_sha256(file_path)
+    key_parts = [source_sha256, list(features), LABEL, threshold] + (["trials"] if from_trials else [])
+    key = hashlib.sha256(json.dumps(key_parts).encode()).hexdigest()
+    cache_path = os.path.join(cache_dir, key[:24] + ".npz") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            print(f"♻️  Using cached feature matrix {cache_path}")
+            return cached["X"], cached["y"], source_sha256
+
+    # Load only the needed columns in row chunks so large exports don't have to fit in memory,
+    # dropping rows with missing values chunk by chunk
+    extracted = [f for f in features if f in RAW_FEATURES] if from_trials else []
+    columns = [f for f in features if f not in extracted] + [LABEL] + (trial_columns() if extracted else [])
+    Xs, ys = [], []
+    for chunk in pd.read_csv(file_path, delimiter=";", encoding="utf-8-sig", usecols=columns, chunksize=chunksize):
+        chunk = chunk.dropna(subset=columns)
+        scores = extract_features(to_trial_array(chunk)) if extracted else {}
+        Xs.append(np.column_stack([scores[f] if f in scores else chunk[f].to_numpy(dtype=float)
+                                   for f in features]) if len(chunk) else np.empty((0, len(features))))
+        ys.append(chunk[LABEL].to_numpy(dtype=float))
+    X, y = np.concatenate(Xs), np.concatenate(ys)
+    # Extracted scores are NaN for sessions they are undefined for (e.g. no targets); kernels refuse those
+    finite = np.isfinite(X).all(axis=1)
+    X, y = X[finite], (y[finite] >= threshold).astype(np.int8)
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = cache_path + ".tmp.npz"
+        np.savez(tmp_path, X=X, y=y)
+        os.replace(tmp_path, cache_path)
+    return X, y, source_sha256
+
+
+def measure_latency(scorer, X, single_repeat=200, batch_rows=1000, batch_repeat=20):
+    # Median wall time of the serving path: one row (as /checklist and /predict score) and a batch
+    row = X[:1]
+    batch = X[np.arange(batch_rows) % len(X)]
+    single, batched = [], []
+    for _ in range(single_repeat):
+        start = time.perf_counter()
+        scorer.probability(row)
+        single.append(time.perf_counter() - start)
+    for _ in range(batch_repeat):
+        start = time.perf_counter()
+        scorer.probability(batch)
+        batched.append(time.perf_counter() - start)
+    return {
+        "single_row_ms": float(np.median(single) * 1000),
+        "batch_rows": batch_rows,
+        "batch_ms": float(np.median(batched) * 1000),
+    }
+
+
+def _fit_candidate(family, params, seed, X_train, y_train):
+    make_model, _ = SEARCH_SPACES[family]
+    pipeline = Pipeline([("scaler", StandardScaler()), ("model", make_model(seed))]).set_params(**params)
+    return pipeline.fit(X_train, y_train)
+
+
+def search(X_train, y_train, X_test, y_test, folds=5, seed=42, n_jobs=-1, families=None):
+    """Cross-validate every candidate of each model family; returns a list of candidate records."""
+    cv = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+    scored = []
+    for family, (make_model, grid) in SEARCH_SPACES.items():
+        if families and family not in families:
+            continue
+        pipeline = Pipeline([("scaler", StandardScaler()), ("model", make_model(seed))])
+        # Every (parameter set, fold) fit runs on its own core
+        grid_search = GridSearchCV(pipeline, grid, cv=cv, scoring="accuracy", n_jobs=n_jobs, refit=False)
+        start = time.perf_counter()
+        grid_search.fit(X_train, y_train)
+        results = grid_search.cv_results_
+        print(f"🔎 {family}: {len(results['params'])} candidates x {folds} folds "
+              f"in {time.perf_counter() - start:.1f}s")
+        for i, params in enumerate(results["params"]):
+            scored.append((family, params, float(results["mean_test_score"][i]), float(results["std_test_score"][i])))
+
+    # Refit each candidate on the whole training split (in parallel) to test and time what would be served
+    fitted = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_candidate)(family, params, seed, X_train, y_train) for family, params, _, _ in scored
+    )
+    candidates = []
+    for (family, params, cv_mean, cv_std), pipeline in zip(scored, fitted):
+        # Latency is measured one candidate at a time so the timings don't compete for cores
+        scorer = build_scorer(pipeline.named_steps["model"], pipeline.named_steps["scaler"])
+        proba = scorer.probability(X_test)
+        candidates.append({
+            "family": family,
+            "params": {k.split("__", 1)[1]: v for k, v in params.items()},
+            "cv_accuracy": cv_mean,
+            "cv_accuracy_std": cv_std,
+            "test_accuracy": float(accuracy_score(y_test, proba >= 0.5)),
+            "test_roc_auc": float(roc_auc_score(y_test, proba)) if len(np.unique(y_test)) == 2 else None,
+            "latency": measure_latency(scorer, X_test),
+            "pipeline": pipeline,
+        })
+    return candidates
+
+
+def pick_winner(candidates, max_latency_ms=None):
+    # Best cross-validated accuracy within the latency budget; ties go to the faster model
+    eligible = [c for c in candidates
+                if max_latency_ms is None or c["latency"]["single_row_ms"] <= max_latency_ms]
+    if not eligible:
+        raise SystemExit(f"❌ No candidate scores a row within {max_latency_ms} ms")
+    return max(eligible, key=lambda c: (round(c["cv_accuracy"], 6), -c["latency"]["single_row_ms"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train LR and RF candidates and bundle the best one")
+    parser.add_argument("input", help="CPT-II export (semicolon-delimited CSV)")
+    parser.add_argument("-o", "--output", default=DEFAULT_BUNDLE_PATH, help="model bundle to write")
+    parser.add_argument("--features", default=LEGACY_FEATURES_PATH,
+                        help="joblib feature list defining the serving schema")
+    parser.add_argument("--from-trials", action="store_true",
+                        help="extract the raw-score features from the trial columns (for live CPT scoring)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"{LABEL} at or above which a row is labelled ADHD")
+    parser.add_argument("--family", action="append", choices=sorted(SEARCH_SPACES),
+                        help="only search these model families (repeatable)")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--jobs", type=int, default=-1, help="parallel fits (-1 = all cores)")
+    parser.add_argument("--max-latency-ms", type=float, help="ignore candidates slower than this per row")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="feature matrix cache ('' disables)")
+    parser.add_argument("--report", help="JSON report path (defaults to <output>.report.json)")
+    parser.add_argument("--version", help="bundle version label (defaults to the content hash)")
+    args = parser.parse_args(argv)
+
+    features = list(joblib.load(args.features))
+    X, y, source_sha256 = load_feature_matrix(args.input, features, args.threshold, args.cache_dir,
+                                              from_trials=args.from_trials)
+    print(f"📥 {len(y)} rows, {len(features)} features, {int(y.sum())} positive")
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=args.test_size, random_state=args.seed, stratify=y
+    )
+    candidates = search(X_train, y_train, X_test, y_test, args.folds, args.seed, args.jobs, args.family)
+    winner = pick_winner(candidates, args.max_latency_ms)
+
+    print("\n📊 Candidates (cv accuracy / test accuracy / ms per row):\n")
+    for c in sorted(candidates, key=lambda c: -c["cv_accuracy"]):
+        marker = "➡️ " if c is winner else "   "
+        print(f"{marker}{c['family']:<20} {c['cv_accuracy']:.3f}±{c['cv_accuracy_std']:.3f}  "
+              f"{c['test_accuracy']:.3f}  {c['latency']['single_row_ms']:.3f}  {c['params']}")
+
+    pipeline = winner["pipeline"]
+    print(f"\n🏆 {winner['family']} {winner['params']}\n")
+    print(classification_report(y_test, pipeline.predict(X_test), zero_division=0))
+
+    # Training distribution for the apps' drift monitor; written before the bundle it describes
+    drift_path = reference_path(args.output)
+    save_reference(drift_path, build_reference(X_train, features))
+    manifest = save_bundle(args.output, pipeline.named_steps["model"], pipeline.named_steps["scaler"],
+                           features, version=args.version,
+                           feature_source="trials" if args.from_trials else "export")
+    report = {
+        "bundle": args.output,
+        "version": manifest["version"],
+        "source": args.input,
+        "source_sha256": source_sha256,
+        "rows": int(len(y)),
+        "threshold": args.threshold,
+        "feature_source": manifest["feature_source"],
+        "seed": args.seed,
+        "drift_reference": drift_path,
+        "folds": args.folds,
+        "winner": {k: v for k, v in winner.items() if k != "pipeline"},
+        "candidates": [{k: v for k, v in c.items() if k != "pipeline"} for c in candidates],
+    }
+    report_path = args.report or os.path.splitext(args.output)[0] + ".report.json"
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Bundle {manifest['version']} saved at: {args.output} (report: {report_path})")
+    return report
+
 
-# Dataset path (update if filename changes)
-file_path = "/Users/sg/Documents/ICBT/Bsc.SE/2ns sem/FP/CPT_II_ConnersContinuousPerformanceTest (2).csv"
-
-# Load dataset with correct delimiter
-df = pd.read_csv(file_path, delimiter=";")
-
-# Features we’ll use
-features = [
-    "General TScore Omissions", "Adhd TScore Omissions", "Raw Score Omissions",
-    "General TScore Commissions", "Adhd TScore Commissions", "Raw Score Commissions",
-    "General TScore HitRT", "Raw Score HitRT", "General TScore VarSE",
-    "Adhd TScore DPrime", "Raw Score DPrime"
-]
-label = "Adhd Confidence Index"
-
-# Drop missing values
-df = df.dropna(subset=features + [label])
-
-# Select features (X) and target (y)
-X = df[features]
-y = df[label]
-
-# Encode target if it’s categorical (turns strings into numbers)
-y = y.astype("category").cat.codes
-
-# Train-test split (80% train, 20% test)
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, random_state=42
-)
-
-# Train a Random Forest model
-model = RandomForestClassifier(n_estimators=100, random_state=42)
-model.fit(X_train, y_train)
-
-# Evaluate model
-y_pred = model.predict(X_test)
-print("\n📊 Model Performance:\n")
-print(classification_report(y_test, y_pred))
-
-# Save model
-output_model = os.path.join(os.path.dirname(file_path), "adhd_model.pkl")
-joblib.dump(model, output_model)
-print(f"\n✅ Model saved at: {output_model}")
+if __name__ == "__main__":
+    main()
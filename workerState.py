@@ -0,0 +1,169 @@
+"""Per-worker state shared through a directory, so one worker can answer for all of them.
+
+Under serve.py every worker process keeps its own metrics, prediction cache, drift histograms and
+profiler stacks, and a /metrics scrape or admin request reaches whichever worker accepts it. With a
+shared directory (ADHD_METRICS_DIR, which serve.py sets when it runs several workers), each worker
+writes the state registered with it to its own JSON shard every `interval` seconds, and
+gather(name) reads every worker's shard: {pid: state}, with the caller's own state fresh.
+publish(name, value) hands a setting or command (a drift reset, a profiler configuration) to every
+worker, which applies it on its next flush. Shards of workers that have exited stay, so counters
+keep what those workers served.
+
+Without a directory nothing is written and gather() returns this process's state only.
+"""
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+
+from processLocal import ProcessLocal
+
+SHARD_PREFIX = 'worker-'
+SETTING_PREFIX = 'setting-'
+
+
+def _write_json(path, payload):
+    # Written aside and renamed, so readers never see a partial file
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def clear(directory):
+    """Create `directory` and drop the shards and settings of an earlier server run."""
+    os.makedirs(directory, exist_ok=True)
+    for pattern in (SHARD_PREFIX + '*', SETTING_PREFIX + '*'):
+        for path in glob.glob(os.path.join(directory, pattern)):
+            os.remove(path)
+
+
+class WorkerState:
+    def __init__(self, directory=None, interval=1.0):
+        self.directory = os.path.abspath(directory) if directory else None
+        self.interval = interval
+        self._sources = {}    # name -> fn() returning JSON-serialisable state
+        self._handlers = {}   # setting name -> fn(value)
+        self._applied = {}    # setting name -> epoch last applied in this process
+        self._lock = threading.Lock()
+        # Each worker starts its own flusher on first use (threads don't survive fork)
+        self._thread = ProcessLocal(self._start_flusher)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def register(self, name, source):
+        """Publish source() in this worker's shard under `name`."""
+        self._sources[name] = source
+
+    def subscribe(self, name, handler):
+        """Call handler(value) whenever any worker publishes setting `name`."""
+        self._handlers[name] = handler
+        self._applied[name] = self._read_setting(name)[0]
+
+    def _setting_path(self, name):
+        return os.path.join(self.directory, f'{SETTING_PREFIX}{name}.json')
+
+    def _read_setting(self, name):
+        if not self.directory:
+            return self._applied.get(name, 0), None
+        setting = _read_json(self._setting_path(name)) or {}
+        return setting.get('epoch', 0), setting.get('value')
+
+    def _apply(self, name, epoch, value):
+        self._handlers[name](value)
+        self._applied[name] = epoch
+
+    def publish(self, name, value=None):
+        """Apply setting `name` here now, and in every other worker on its next flush."""
+        if not self.directory:
+            self._apply(name, self._applied.get(name, 0) + 1, value)
+            return
+        with open(os.path.join(self.directory, '.settings.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            epoch = self._read_setting(name)[0] + 1
+            _write_json(self._setting_path(name), {'epoch': epoch, 'value': value})
+        with self._lock:
+            self._apply(name, epoch, value)
+        self.flush()
+
+    def _start_flusher(self):
+        thread = threading.Thread(target=self._run, name='worker-state', daemon=True)
+        thread.start()
+        return thread
+
+    def start(self):
+        """Start writing this process's shard every `interval` seconds (no-op without a directory)."""
+        if self.directory:
+            self._thread.get()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"⚠️  Could not write worker state to {self.directory}: {e}")
+
+    def flush(self, exited=False):
+        """Apply settings published by other workers, then write this worker's shard."""
+        if not self.directory:
+            return
+        with self._lock:
+            for name in self._handlers:
+                epoch, value = self._read_setting(name)
+                if epoch > self._applied.get(name, 0):
+                    self._apply(name, epoch, value)
+            applied = dict(self._applied)
+        shard = {'pid': os.getpid(), 'written_at': time.time(), 'exited': exited, 'applied': applied,
+                 'state': {name: source() for name, source in self._sources.items()}}
+        _write_json(os.path.join(self.directory, f'{SHARD_PREFIX}{os.getpid()}.json'), shard)
+
+    def close(self):
+        # Final shard of an exiting worker; its counters stay in the totals, its gauges drop out
+        self.flush(exited=True)
+
+    def gather(self, name, live=False, setting=None):
+        """{pid: state} registered as `name` by every worker, this one's current.
+
+        live: only workers still running. setting: only workers that have applied the latest
+        publish of that setting, e.g. a reset, so state from before it is left out.
+        """
+        if not self.directory:
+            return {os.getpid(): self._sources[name]()}
+        self.flush()
+        current = self._applied.get(setting)
+        states = {}
+        for path in glob.glob(os.path.join(self.directory, SHARD_PREFIX + '*.json')):
+            shard = _read_json(path)
+            if shard is None or name not in shard['state']:
+                continue
+            if live and (shard['exited'] or not _alive(shard['pid'])):
+                continue
+            if setting and shard['applied'].get(setting) != current:
+                continue
+            states[shard['pid']] = shard['state'][name]
+        return states
+
+    def stats(self):
+        return {'directory': self.directory, 'interval': self.interval, 'sources': sorted(self._sources),
+                'settings': dict(self._applied)}